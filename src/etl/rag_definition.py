@@ -10,9 +10,11 @@ from step1_yt_raw_data.merge_csv import merge_csv
 from step1_yt_raw_data.insert_to_mongo import insert_to_mongo
 
 from step1_spotify_raw_data.spotify_category_songlist import spotify_category_songlist
-from step1_spotify_raw_data.wait_between_assets import wait_between_assets
+from step1_spotify_raw_data.wait_between_assets import wait_between_assets, DEFERRED_RUN_TAG
 from step1_spotify_raw_data.spotify_song_features import spotify_song_features
 from step1_spotify_raw_data.spotify_to_mongodb import spotify_to_mongodb
+from step1_spotify_raw_data.scheduler import load_rate_state, budget_ready_at
+from step1_spotify_raw_data.io_manager import SpotifyParquetIOManager
 
 from step2_feature_selection.sp_cleaning_code.sp_clean import sp_clean
 from step2_feature_selection.yt_cleaning_code.yt_clean import yt_clean
@@ -21,8 +23,11 @@ from step2_feature_selection.feast.feast_store import materialize_incrementally
 
 from step3_embedding.app import main
 
+from snapshot_catalog import snapshots_complete
+
 from pymongo import MongoClient
 import os
+import time
 from datetime import datetime
 from dotenv import load_dotenv
 # import redis
@@ -54,6 +59,12 @@ step1_spotify_raw_data_job = define_asset_job(
     selection=AssetSelection.groups("step1_spotify_raw_data")
 )
 
+# spotify_song_features deferred by wait_between_assets (rate budget exhausted), run by trigger_spotify_song_features
+spotify_song_features_job = define_asset_job(
+    name="spotify_song_features_job",
+    selection=AssetSelection.assets(spotify_song_features, spotify_to_mongodb)
+)
+
 step2_feature_selection_job = define_asset_job(
     name="step2_feature_selection_job",
     selection=AssetSelection.groups("step2_feature_selection")
@@ -78,14 +89,39 @@ def trigger_step2(context):
     yt_collection = f'yt_category_songlist_{today}' 
     sp_collection = f'spotify_data_{today}' 
     
-    collections = db.list_collection_names()
-
-    if yt_collection in collections and sp_collection in collections:
-        context.log.info(f"Both collections '{yt_collection}' and '{sp_collection}' exist. Triggering job...")
+    # snapshot catalog: both collections of today written completely (not only created)
+    if snapshots_complete(db, ["yt", "spotify"], today):
+        context.log.info(f"Both collections '{yt_collection}' and '{sp_collection}' are complete. Triggering job...")
      
         yield RunRequest(run_key=today) # run key相同時，不會重複執行。 同一天內不會被重複執行，隔一天時，以yt, sp collection條件不符也不會被執行
     else:
-        context.log.info(f"One or both collections do not exist, step2_feature_selection_job not triggered.")
+        context.log.info(f"One or both collections are not complete yet, step2_feature_selection_job not triggered.")
+
+# trigger the deferred spotify_song_features once the persisted rate budget of the spotify clients is back
+@sensor(
+        job=spotify_song_features_job,
+        minimum_interval_seconds=300 # sensor every 5 min
+        )
+def trigger_spotify_song_features(context):
+
+    state = load_rate_state()
+    # the deferring run (its date and run id), not today: the budget can come back after midnight
+    deferred_date = state.get("deferred_date")
+    deferred_run_id = state.get("deferred_run_id", deferred_date)
+
+    if deferred_date is None:
+        context.log.info("spotify_song_features not deferred, spotify_song_features_job not triggered.")
+        return
+
+    ready_at = budget_ready_at(state)
+    if ready_at <= time.time():
+        context.log.info(f"Spotify rate budget is back. Triggering job deferred on {deferred_date}...")
+        # the deferral is cleared by spotify_song_features once the run has fetched the features (tag: which deferral);
+        # until then every tick requests the same run key, and dagster launches it only once
+        yield RunRequest(run_key=f"spotify_song_features_{deferred_run_id}", # 同一個deferral只觸發一次
+                         tags={DEFERRED_RUN_TAG: deferred_run_id})
+    else:
+        context.log.info(f"Spotify rate budget exhausted until {datetime.fromtimestamp(ready_at)}, spotify_song_features_job not triggered.")
 
 # trigger_step3 by sensoring redis
 # @sensor(job=step3_embedding_job, 
@@ -120,14 +156,20 @@ defs = Definitions(
         main # step3_embedding
         ], 
 
+    resources={
+        "spotify_parquet_io_manager": SpotifyParquetIOManager(), # spotify asset hand-offs: data/today/spotify/*.parquet
+    },
+
     sensors=[
         trigger_step2, 
+        trigger_spotify_song_features,
         trigger_step3
     ],
     
     jobs=[
         step1_yt_raw_data_job, 
         step1_spotify_raw_data_job, 
+        spotify_song_features_job,
         step2_feature_selection_job, 
         step3_embedding_job
         ],
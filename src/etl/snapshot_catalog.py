@@ -0,0 +1,51 @@
+from datetime import datetime
+
+from pymongo import ASCENDING, DESCENDING
+
+# snapshot catalog (mongo collection "snapshot_catalog") ================
+# one document per weekly snapshot collection, written by the asset that fills it:
+#     {"_id": "spotify_data_20241021", "source": "spotify", "date": "20241021",
+#      "rows": 12345, "status": "complete", "updated_at": datetime}
+# source: "spotify" (spotify_data_yyyymmdd) or "yt" (yt_category_songlist_yyyymmdd)
+# status: "writing" while the collection is filled, then "complete" or "failed"
+# readers (step2 get_latest_*, trigger_step2) find the latest complete snapshot with one indexed read,
+# instead of listing every collection and parsing the dates out of the names.
+CATALOG_COLLECTION = "snapshot_catalog"
+
+WRITING = "writing"
+COMPLETE = "complete"
+FAILED = "failed"
+
+
+def catalog_collection(db):
+    catalog = db[CATALOG_COLLECTION]
+    # no-op when the index exists
+    catalog.create_index([("source", ASCENDING), ("status", ASCENDING), ("date", DESCENDING)])
+    return catalog
+
+
+def record_snapshot(db, source, collection_name, date, status, rows=None):
+    """
+    Insert / update the catalog entry of one snapshot collection (date: "yyyymmdd").
+    """
+    update = {"source": source, "date": date, "status": status, "updated_at": datetime.now()}
+    if rows is not None:
+        update["rows"] = rows
+    catalog_collection(db).update_one({"_id": collection_name}, {"$set": update}, upsert=True)
+
+
+def latest_snapshot(db, source):
+    """
+    Catalog entry of the latest complete snapshot of source, None when the catalog has none.
+    """
+    return catalog_collection(db).find_one({"source": source, "status": COMPLETE}, sort=[("date", DESCENDING)])
+
+
+def snapshots_complete(db, sources, date):
+    """
+    True when every source has a complete snapshot of date ("yyyymmdd").
+    """
+    complete = catalog_collection(db).distinct("source", {"source": {"$in": list(sources)},
+                                                          "date": date,
+                                                          "status": COMPLETE})
+    return set(complete) == set(sources)
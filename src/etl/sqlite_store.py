@@ -0,0 +1,34 @@
+import os
+import sqlite3
+
+# sqlite limits the number of ? in one query: IN (...) lookups are split into chunks of keys
+IN_CHUNK_SIZE = 500
+
+
+class SqliteStore:
+    """
+    Base of the on-disk key-value caches shared across weekly runs (AudioFeaturesStore, LanguageCache,
+    ResponseCache): one sqlite file, created with its tables on first use.
+    """
+
+    def __init__(self, path, schema, check_same_thread=True):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=check_same_thread)
+        for statement in schema:
+            self.conn.execute(statement)
+        self.conn.commit()
+
+    def select_in(self, query, keys, params=(), chunk_size=IN_CHUNK_SIZE):
+        """
+        Rows of query for all keys: query has one {keys} placeholder for the IN list, after params.
+        """
+        keys = list(keys)
+        rows = []
+        for i in range(0, len(keys), chunk_size):
+            chunk = keys[i:i+chunk_size]
+            rows.extend(self.conn.execute(query.format(keys=",".join("?" * len(chunk))), [*params, *chunk]))
+        return rows
+
+    def close(self):
+        self.conn.close()
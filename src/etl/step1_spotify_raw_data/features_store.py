@@ -0,0 +1,53 @@
+import json
+import os
+import time
+
+from sqlite_store import SqliteStore
+from .prop import generate_logger
+
+logger = generate_logger(__file__)
+
+# audio features of every track ever fetched (data/spotify_audio_features.sqlite), shared across weekly runs
+script_dir = os.path.dirname(os.path.abspath(__file__))
+STORE_PATH = os.path.join(script_dir, os.getenv('SPOTIFY_FEATURES_STORE_PATH', '../data/spotify_audio_features.sqlite'))
+
+
+class AudioFeaturesStore(SqliteStore):
+    """
+    spotify audio_features by track id: the features of a track never change, so it is requested only once.
+    Tracks without features (null) are not stored. Use it from the asset thread only.
+    """
+
+    def __init__(self, path=STORE_PATH):
+        super().__init__(path, ["""
+            CREATE TABLE IF NOT EXISTS audio_features (
+                track_id TEXT PRIMARY KEY,
+                features TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+        """])
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, track_ids):
+        """
+        Return {track_id: features} of the given ids that are in the store.
+        """
+        track_ids = list(dict.fromkeys(track_ids))
+        rows = self.select_in("SELECT track_id, features FROM audio_features WHERE track_id IN ({keys})", track_ids)
+        found = {track_id: json.loads(features) for track_id, features in rows}
+        self.hits += len(found)
+        self.misses += len(track_ids) - len(found)
+        return found
+
+    def put_many(self, features_list):
+        now = time.time()
+        rows = [(features['id'], json.dumps(features, ensure_ascii=False), now)
+                for features in features_list if features and features.get('id')]
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO audio_features (track_id, features, fetched_at) VALUES (?, ?, ?)", rows)
+        self.conn.commit()
+        return len(rows)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
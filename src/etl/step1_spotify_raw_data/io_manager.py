@@ -0,0 +1,41 @@
+import os
+import uuid
+from datetime import datetime
+
+import pandas as pd
+from dagster import ConfigurableIOManager, InputContext, MetadataValue, OutputContext
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+class SpotifyParquetIOManager(ConfigurableIOManager):
+    """
+    Hand-off between the spotify assets: one parquet file per asset per run,
+    data/{yyyymmdd}/spotify/{asset}_{run_id}.parquet, instead of csv / scratch files in the working directory.
+    The file is written to a temp path (unique per write) and renamed, so a reader never sees a half-written file,
+    and two runs never write the same file.
+    The path is stored in the materialization metadata; an input is loaded from the path of the latest
+    materialization of its asset, so a run deferred to a later day (trigger_spotify_song_features)
+    still reads the file written by the run that produced it.
+    """
+
+    base_dir: str = os.path.join(script_dir, "../data")
+
+    def _path(self, context: OutputContext) -> str:
+        today = datetime.today().strftime('%Y%m%d')
+        return os.path.join(self.base_dir, today, "spotify", f"{context.asset_key.path[-1]}_{context.run_id}.parquet")
+
+    def handle_output(self, context: OutputContext, obj: pd.DataFrame):
+        path = self._path(context)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        obj.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        context.add_output_metadata({"rows": len(obj), "path": MetadataValue.path(path)})
+
+    def load_input(self, context: InputContext) -> pd.DataFrame:
+        event = context.instance.get_latest_materialization_event(context.asset_key)
+        path = event.asset_materialization.metadata.get("path") if event is not None else None
+        if path is None:
+            raise FileNotFoundError(f"no materialization with a parquet path for {context.asset_key.to_user_string()}")
+        return pd.read_parquet(path.value)
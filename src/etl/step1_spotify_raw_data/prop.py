@@ -26,12 +26,13 @@ def generate_logger(filename: str):
     
     script_dir = os.path.dirname(os.path.abspath(__file__))
     relative_data_path_dir = f"../data/{today}"
-    absolute_data_path_dir = os.path.join(script_dir, relative_data_path_dir) # data/today
+    # log檔位置: ETL_LOG_DIR (例如測試時的暫存資料夾), 預設 data/today
+    absolute_data_path_dir = os.getenv('ETL_LOG_DIR') or os.path.join(script_dir, relative_data_path_dir)
 
     if os.path.exists(absolute_data_path_dir) == False:
         os.makedirs(absolute_data_path_dir)
 
-    filename = filename.split('\\')[-1]
+    filename = os.path.basename(filename) # windows / linux 路徑都只留檔名
 
     # 確保每次都建立新的 logger
     logger = logging.getLogger(filename)
@@ -51,15 +52,3 @@ def generate_logger(filename: str):
         logger.addHandler(stream_handler)
 
     return logger
-
-# Splitting the playlist.csv file into 6 sub-files
-def split_playlist_csv(df: pd.DataFrame, num_clients: int):
-    sub_csv_paths = []
-    sub_dfs = np.array_split(df, num_clients)  # Split the dataframe into 6 parts
-
-    for i, sub_df in enumerate(sub_dfs):
-        sub_csv_path = f'sub_playlist_{i+1}.csv'
-        sub_df.to_csv(sub_csv_path, index=False)
-        sub_csv_paths.append(sub_csv_path)
-    
-    return sub_csv_paths
\ No newline at end of file
@@ -0,0 +1,77 @@
+import json
+import os
+import random
+
+import requests
+import spotipy
+
+from .prop import generate_logger
+
+logger = generate_logger(__file__)
+
+# failed requests, replayed by the next run (data/spotify_dead_letters.json)
+script_dir = os.path.dirname(os.path.abspath(__file__))
+DEAD_LETTERS_PATH = os.path.join(script_dir, os.getenv('SPOTIFY_DEAD_LETTERS_PATH', '../data/spotify_dead_letters.json'))
+
+
+# retry policy ===================================================
+class RetryPolicy:
+    """
+    Retry of one request (counted per request, not shared across requests / threads):
+        - only transient errors are retried: 5xx, connection errors, timeouts, bad json
+          (429 is handled by the scheduler: Retry-After pause of the credential, not counted here)
+        - attempt n waits a random time in [0, min(max_delay, base_delay * 2 ** n)] (exponential backoff, full jitter)
+        - after max_attempts the request has failed for good (dead letter)
+    """
+
+    RETRY_STATUS = (500, 502, 503, 504)
+
+    def __init__(self, max_attempts=int(os.getenv('SPOTIFY_RETRY_MAX_ATTEMPTS', 5)),
+                 base_delay=float(os.getenv('SPOTIFY_RETRY_BASE_DELAY', 1.0)),
+                 max_delay=float(os.getenv('SPOTIFY_RETRY_MAX_DELAY', 60.0))):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def is_retryable(self, exc):
+        if isinstance(exc, spotipy.exceptions.SpotifyException):
+            return exc.http_status in self.RETRY_STATUS
+        return isinstance(exc, (requests.exceptions.ConnectionError,
+                                requests.exceptions.Timeout,
+                                json.decoder.JSONDecodeError))
+
+    def should_retry(self, exc, attempt):
+        # attempt: number of attempts already made (1 after the first failure)
+        return attempt < self.max_attempts and self.is_retryable(exc)
+
+    def delay(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+# dead letters ===================================================
+# {"<scheduler name>": [<record>, ...]}: the records that failed for good in the last run of each asset
+def load_dead_letters(name, path=DEAD_LETTERS_PATH):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get(name, [])
+    except (FileNotFoundError, json.JSONDecodeError):
+        return []
+
+def save_dead_letters(name, records, path=DEAD_LETTERS_PATH):
+    """
+    Replace the dead letters of name with records (the ones replayed this run and failed again are in records).
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            dead_letters = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        dead_letters = {}
+    dead_letters[name] = records
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(dead_letters, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    if records:
+        logger.warning(f"{name}: {len(records)} requests failed for good, saved for the next run")
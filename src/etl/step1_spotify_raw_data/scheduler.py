@@ -0,0 +1,316 @@
+import heapq
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+
+import spotipy
+
+from .prop import generate_logger
+from .retry_policy import RetryPolicy
+
+logger = generate_logger(__file__)
+
+# per-credential request rate (requests / sec): start at RATE, grow by RATE_INCREASE per success up to MAX_RATE,
+# halve on a 429 (down to MIN_RATE). BURST requests can go out back to back.
+RATE = float(os.getenv('SPOTIFY_RATE_PER_SEC', 1.0))
+MIN_RATE = float(os.getenv('SPOTIFY_MIN_RATE_PER_SEC', 0.05))
+MAX_RATE = float(os.getenv('SPOTIFY_MAX_RATE_PER_SEC', 5.0))
+RATE_INCREASE = float(os.getenv('SPOTIFY_RATE_INCREASE', 0.02))
+BURST = int(os.getenv('SPOTIFY_BURST', 5))
+# 429 without a Retry-After header
+DEFAULT_RETRY_AFTER = float(os.getenv('SPOTIFY_DEFAULT_RETRY_AFTER', 5))
+# a request is given up after this many 429s (on any credential)
+MAX_THROTTLED = int(os.getenv('SPOTIFY_MAX_THROTTLED', 10))
+
+# rate-limit state of each credential, kept across runs (data/spotify_rate_state.json)
+script_dir = os.path.dirname(os.path.abspath(__file__))
+STATE_PATH = os.path.join(script_dir, os.getenv('SPOTIFY_RATE_STATE_PATH', '../data/spotify_rate_state.json'))
+# the budget is available when at least this many credentials are not paused by a Retry-After
+MIN_READY_CLIENTS = int(os.getenv('SPOTIFY_MIN_READY_CLIENTS', 1))
+
+
+# token bucket ===================================================
+class TokenBucket:
+    """
+    Request budget of one credential (one spotify app).
+    Tokens refill at `rate` per sec up to `capacity`; a request takes one token.
+    A 429 empties the bucket, pauses it for Retry-After sec and halves the rate;
+    every success adds RATE_INCREASE back (AIMD), so the rate settles at what the app is allowed.
+    """
+
+    def __init__(self, name, rate=RATE, capacity=BURST, min_rate=MIN_RATE, max_rate=MAX_RATE,
+                 increase=RATE_INCREASE):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.requests = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def _take(self):
+        # take a token if there is one: return 0, else the time to wait for it
+        with self._lock:
+            now = time.monotonic()
+            if now < self.paused_until:
+                return self.paused_until - now
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                self.requests += 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def wait_time(self):
+        # time until a token is available (0: now), without taking it
+        with self._lock:
+            now = time.monotonic()
+            if now < self.paused_until:
+                return self.paused_until - now
+            tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            return 0 if tokens >= 1 else (1 - tokens) / self.rate
+
+    def acquire(self):
+        wait = self._take()
+        while wait > 0:
+            time.sleep(wait)
+            wait = self._take()
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttled(self, retry_after):
+        with self._lock:
+            now = time.monotonic()
+            self.paused_until = max(self.paused_until, now + retry_after)
+            self.tokens = 0.0
+            self.updated = self.paused_until
+            self.rate = max(self.min_rate, self.rate * 0.5)
+            self.throttled += 1
+        logger.warning(f"{self.name} rate limited: paused {retry_after:.0f} sec, rate -> {self.rate:.2f}/sec")
+
+    def stats(self):
+        return {"requests": self.requests, "throttled": self.throttled, "rate": round(self.rate, 3)}
+
+    def to_state(self):
+        # paused_until as wall-clock time, so it means the same in the next process
+        with self._lock:
+            remaining = max(0.0, self.paused_until - time.monotonic())
+            return {"rate": self.rate, "paused_until": time.time() + remaining}
+
+    def load_state(self, entry):
+        with self._lock:
+            self.rate = min(self.max_rate, max(self.min_rate, entry.get("rate", self.rate)))
+            remaining = entry.get("paused_until", 0) - time.time()
+            if remaining > 0:
+                self.paused_until = time.monotonic() + remaining
+                self.tokens = 0.0
+                self.updated = self.paused_until
+
+
+# persisted rate-limit state =====================================
+# {"clients": {"client_1": {"rate": 1.2, "paused_until": <epoch sec>}, ...}, "deferred_date": "yyyymmdd",
+#  "deferred_run_id": <run id of the run that deferred spotify_song_features>}
+_state_lock = threading.RLock()
+
+def load_rate_state(path=STATE_PATH):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        state = {}
+    state.setdefault("clients", {})
+    return state
+
+def update_rate_state(update, path=STATE_PATH):
+    """
+    Read the state, apply update(state) and write it back.
+    Written to a temp file then renamed, so a reader (the sensor) never sees a half-written file.
+    """
+    with _state_lock:
+        state = load_rate_state(path)
+        update(state)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+def budget_ready_at(state, min_ready=MIN_READY_CLIENTS):
+    """
+    Epoch time from which at least min_ready credentials are not paused (now or earlier: ready).
+    """
+    paused_until = sorted(entry.get("paused_until", 0) for entry in state["clients"].values())
+    if len(paused_until) < min_ready:
+        return 0 # no state recorded yet (every scheduler run records all its credentials)
+    return paused_until[min_ready - 1]
+
+
+def retry_after_seconds(exc: spotipy.exceptions.SpotifyException):
+    headers = getattr(exc, 'headers', None) or {}
+    try:
+        return float(headers.get('Retry-After', DEFAULT_RETRY_AFTER))
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER
+
+
+# scheduler ======================================================
+class RequestScheduler:
+    """
+    Run one kind of request for many keys over all spotify clients.
+    One worker thread per client takes keys from a single shared queue (work stealing):
+    a client waits for its own TokenBucket before it takes a key, so a throttled client simply takes fewer keys,
+    and a key that got a 429 goes back to the queue for any client to pick up.
+    Other transient errors are retried per request with the RetryPolicy (backoff + jitter, attempt cap):
+    the key waits in a delay heap, no worker thread sleeps for it. Keys that failed for good are in self.failed.
+    The buckets start from the persisted rate state (rate, Retry-After pause) and save it back after a run
+    and after every 429, so the next phase / run starts from what the apps are currently allowed.
+
+    usage:
+        scheduler = RequestScheduler(sp_client)
+        for playlist_id, items in scheduler.run(lambda client, key: client.playlist(key), playlist_ids):
+            ...
+    expand(key, result) can return follow-up keys (e.g. the later pages of a playlist) found from a result:
+    they are queued right away and run in the same run(), while the other keys are still in flight.
+    """
+
+    def __init__(self, clients, name="spotify", state_path=STATE_PATH, retry_policy=None):
+        self.clients = clients
+        self.name = name
+        self.state_path = state_path
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.failed = [] # keys of the last run that failed for good
+        # one bucket per credential (client_1..6): the same names in every scheduler and in the state file
+        self.buckets = [TokenBucket(f"client_{i+1}") for i in range(len(clients))]
+
+    def load_state(self):
+        state = load_rate_state(self.state_path)
+        for bucket in self.buckets:
+            bucket.load_state(state["clients"].get(bucket.name, {}))
+
+    def save_state(self):
+        def update(state):
+            for bucket in self.buckets:
+                state["clients"][bucket.name] = bucket.to_state()
+        update_rate_state(update, self.state_path)
+
+    def run(self, request, keys, expand=None):
+        """
+        Yield (key, result) as each request completes (in completion order), for keys and their follow-up keys;
+        result is None when the request failed for good (the key is then also in self.failed).
+        """
+        self.failed = []
+        keys = list(keys)
+        if not keys:
+            return
+        self.load_state()
+
+        # queued item: (key, attempts, throttled)
+        work = queue.Queue()
+        results = queue.Queue()
+        delayed = [] # heap of (due time, seq, item): items waiting for their retry backoff
+        seq = itertools.count()
+        for key in keys:
+            work.put((key, 0, 0))
+        counts = {"remaining": len(keys), # keys without a result yet
+                  "total": len(keys)}     # keys to yield, follow-up keys included
+        lock = threading.Lock()
+
+        def finish(key, result, more_keys=(), failed=False):
+            # follow-up keys are counted before the key is done, so the workers never stop too early
+            with lock:
+                counts["remaining"] += len(more_keys) - 1
+                counts["total"] += len(more_keys)
+            for more_key in more_keys:
+                work.put((more_key, 0, 0))
+            if failed:
+                self.failed.append(key)
+            results.put((key, result))
+
+        def retry_later(item, delay):
+            with lock:
+                heapq.heappush(delayed, (time.monotonic() + delay, next(seq), item))
+
+        def next_item():
+            # move the retries that are due to the queue, then take the next item
+            with lock:
+                now = time.monotonic()
+                while delayed and delayed[0][0] <= now:
+                    work.put(heapq.heappop(delayed)[2])
+            return work.get(timeout=0.5)
+
+        def worker(client, bucket):
+            while True:
+                with lock:
+                    if counts["remaining"] == 0:
+                        return
+                # wait for this client's budget before taking a key, so a client paused by a Retry-After
+                # holds no key: the others take the whole queue (short sleeps, to stop with the run)
+                wait = bucket.wait_time()
+                if wait > 0:
+                    time.sleep(min(wait, 0.5))
+                    continue
+                try:
+                    key, attempts, throttled = next_item()
+                except queue.Empty:
+                    continue # keys are still in flight on other clients, or waiting for a retry
+
+                bucket.acquire()
+                try:
+                    result = request(client, key)
+                except Exception as exc:
+                    if isinstance(exc, spotipy.exceptions.SpotifyException) and exc.http_status == 429:
+                        if throttled + 1 < MAX_THROTTLED:
+                            bucket.on_throttled(retry_after_seconds(exc))
+                            self.save_state()
+                            work.put((key, attempts, throttled + 1))
+                            continue
+                    elif self.retry_policy.should_retry(exc, attempts + 1):
+                        delay = self.retry_policy.delay(attempts + 1)
+                        logger.warning(f"[{self.name}] {bucket.name} request {key} failed ({exc}), "
+                                       f"retry {attempts + 1} in {delay:.1f} sec")
+                        retry_later((key, attempts + 1, throttled), delay)
+                        continue
+                    logger.error(f"[{self.name}] {bucket.name} request {key} failed: {exc}")
+                    finish(key, None, failed=True)
+                    continue
+
+                bucket.on_success()
+                more_keys = []
+                if expand is not None:
+                    try:
+                        more_keys = list(expand(key, result))
+                    except Exception as exc:
+                        logger.error(f"[{self.name}] expand {key} failed: {exc}")
+                finish(key, result, more_keys)
+
+        threads = [threading.Thread(target=worker, args=(client, bucket), daemon=True)
+                   for client, bucket in zip(self.clients, self.buckets)]
+        for thread in threads:
+            thread.start()
+
+        yielded = 0
+        while True:
+            with lock:
+                if yielded == counts["total"]:
+                    break
+            yield results.get()
+            yielded += 1
+
+        for thread in threads:
+            thread.join()
+        self.save_state()
+        logger.info(f"[{self.name}] scheduler stats: {self.stats()}")
+
+    def stats(self):
+        return {bucket.name: bucket.stats() for bucket in self.buckets}
@@ -10,12 +10,13 @@ import csv
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
-from .prop import generate_logger, split_playlist_csv, initialize_sp_client, RetryLimitExceededError
+from .prop import generate_logger, initialize_sp_client, RetryLimitExceededError
+from .scheduler import RequestScheduler
+from .retry_policy import load_dead_letters, save_dead_letters
 from dagster import asset, AssetExecutionContext
 from random import choice
 
 #變數 ===========================================================================
-retries = 0
 logger = generate_logger(__file__)
 
 
@@ -29,8 +30,13 @@ sp5 = initialize_sp_client(os.getenv("CLIENT_ID_5"), os.getenv("CLIENT_SECRET_5"
 sp6 = initialize_sp_client(os.getenv("CLIENT_ID_6"), os.getenv("CLIENT_SECRET_6"))
 
 sp_client = [sp1, sp2, sp3, sp4, sp5, sp6]
-    
-category_songlist = []
+# 所有請求經由scheduler分配給6個client (每個client一個token bucket)
+scheduler = RequestScheduler(sp_client, name="songlist")
+
+# markets crawled concurrently (SPOTIFY_MARKETS=US,TW,JP): a playlist found in several markets / categories
+# is fetched once (in the first market it was found), and the features of a track are requested once
+MARKETS = [market.strip() for market in os.getenv('SPOTIFY_MARKETS', 'US').split(',') if market.strip()]
+
 items = None
 year = datetime.now().year
 month = datetime.now().month
@@ -38,80 +44,78 @@ day = datetime.now().day
 
 #general functions ==============================================================
 #category
-def category():
+def market_categories(client, market):
+    return client.categories(country=market, locale="en", limit=50, offset=0)
+
+def category(markets=MARKETS):
+    """
+    每個market的category，由6個client同時請求
+    return: [(category_id, market)]
+    """
     category_lst = []
-    categories = choice(sp_client).categories(country="US", locale="en", limit=50, offset=0)
-    # global category_lst
-    for i in range(len(categories['categories']['items'])):
-        category_lst.append(categories['categories']['items'][i]['id'])
-    logger.info("category done")
+    categories_by_market = dict(scheduler.run(market_categories, markets))
+    for market in markets:
+        categories = categories_by_market.get(market)
+        if not categories:
+            continue
+        for item in categories['categories']['items']:
+            category_lst.append((item['id'], market))
+    logger.info(f"category done: {len(category_lst)} categories in {len(markets)} markets")
     return category_lst
 
 #playlist
-def playlist():
-    # global year, month, day
-
-    if os.path.exists(f"category_playlist_{year}_{month}_{day}.json"):
-        os.remove(f"category_playlist_{year}_{month}_{day}.json")
-
-    for j in range(len(category_lst)):
-        category_playlist = choice(sp_client).category_playlists(category_id=category_lst[j], country="US", limit=50, offset=0)
-        with open(f"category_playlist_{year}_{month}_{day}.json", "a") as f:
-            json.dump(category_playlist, f)
-            f.write("\n")
-        sleep(20)
-
-    playlist_lst = []
-    with open(f"category_playlist_{year}_{month}_{day}.json", "r") as o:
-        for line in o.readlines():
-            category_json = json.loads(line)
-            playlist_lst.append(category_json)
-            
-    with open(f"playlist_{year}_{month}_{day}.csv", "w") as o:
-        o.write("category,playlistId\n")
-        for i in range(len(playlist_lst)):
-            for j in range(len(playlist_lst[i]['playlists']['items'])):
-                o.write(f"{playlist_lst[i]['message']},{playlist_lst[i]['playlists']['items'][j]['external_urls']['spotify'].split('/')[-1]}\n")
-
-    logger.info("playlist done")
-    return playlist_lst
+page_size = 50 # category_playlists limit
+
+def category_playlists(client, key):
+    category_id, market, offset = key
+    return client.category_playlists(category_id=category_id, country=market, limit=page_size, offset=offset)
+
+def playlist(category_lst):
+    """
+    每個(category, market)的所有playlist頁面(offset)，由6個client同時請求
+    return: DataFrame(category, playlistId, market), one row per (category, playlistId):
+            market is the first market (in MARKETS order) the playlist was found in
+    """
+    # first page of every category, then the remaining pages once each category's total is known
+    pages = dict(scheduler.run(category_playlists, [(category_id, market, 0) for category_id, market in category_lst]))
+    more_pages = [(category_id, market, offset)
+                  for (category_id, market, _), page in pages.items() if page
+                  for offset in range(page_size, page['playlists']['total'], page_size)]
+    pages.update(scheduler.run(category_playlists, more_pages))
+
+    rows = []
+    seen = set() # (category, playlistId) already listed, in any market
+    for (category_id, market, offset), page in sorted(pages.items(), key=lambda item: (category_lst.index(item[0][:2]), item[0][2])):
+        if not page:
+            continue
+        for item in page['playlists']['items']:
+            if item: # some playlist items are null
+                playlist_id = item['external_urls']['spotify'].split('/')[-1]
+                if (page['message'], playlist_id) not in seen:
+                    seen.add((page['message'], playlist_id))
+                    rows.append({"category": page['message'], "playlistId": playlist_id, "market": market})
+
+    logger.info(f"playlist done: {len(rows)} playlists in {len(pages)} pages")
+    return pd.DataFrame(rows, columns=["category", "playlistId", "market"])
 
 #songlist
-def songlist(client, df, i, items, category_songlist, playlistId):
-    global retries
-    try:
+track_page_size = 100 # playlist tracks per page
+track_fields = "items(added_at,track(name,id,artists(name)))"
+
+def songlist(client, playlistId, offset=0, market="US"):
+    # offset 0: playlist name, tracks total and the first page of tracks; later pages: tracks only
+    if offset == 0:
         items = client.playlist(playlist_id=playlistId,
-                            market="US",
-                            fields="name,tracks(items(added_at,track(name,id,artists(name))))")
-        logger.debug(f"Retrieved playlist {playlistId} for client {client}")
-        append_items(df, i, items, category_songlist)
-        return items
-    except spotipy.exceptions.SpotifyException as exc:
-        while retries < 10:
-            retries += 1
-            if exc.http_status == 429:
-                logger.error(f"{client}'s Rate limit exceeded")
-                sleep(5)
-            elif exc.http_status in (404, 500):
-                logger.error("Track not found or server error")
-                sleep(5)
-            else:
-                sleep(10)
-            return items
-        
-        logger.error("retries exceeded")
-        # raise RetryLimitExceededError("skipping api request")
-
-# Function to process songlist() for a given client and its playlists
-def process_songlist_for_client(client, df, playlist_ids):
-    result_list = []
-    
-    for i, playlist_id in enumerate(playlist_ids):
-        items = songlist(client, df, i, None, category_songlist, playlist_id)  # Call songlist() with client and playlist ID
-        if items:
-            result_list.extend(items)
-    
-    return result_list
+                                market=market,
+                                fields=f"name,tracks(total,{track_fields})")
+    else:
+        items = client.playlist_items(playlist_id=playlistId,
+                                      market=market,
+                                      fields=track_fields,
+                                      limit=track_page_size,
+                                      offset=offset)
+    logger.debug(f"Retrieved playlist {playlistId} (offset {offset}) for client {client}")
+    return items
 
 def append_items(df, i, items, category_songlist):
     # 檢查 'items' 是否存在
@@ -126,7 +130,7 @@ def append_items(df, i, items, category_songlist):
                     'category': df.at[i, 'category'],
                     'playlistId': df.at[i, 'playlistId'],
                     'playlistName': items['name'],
-                    'artist': track_info['track']['artists'],
+                    'artist': json.dumps(track_info['track']['artists'], ensure_ascii=False), # json, not the python repr
                     'track': track_info['track']['name'],
                     'date_added': track_info['added_at'],
                     'trackURL': f"https://open.spotify.com/track/{track_info['track']['id']}",
@@ -135,93 +139,78 @@ def append_items(df, i, items, category_songlist):
                 
                 # 將收集到的資訊加入 category_songlist
                 category_songlist.append(info)
-
-        # 在處理完後添加延遲
-        sleep(8.5)
     else:
         return None  # 如果 items 不存在，直接返回 None
 
-# Parallel request to songlist() for each client and corresponding sub-CSV file
-def parallel_songlist_request(clients, csv_paths):
-    merged_list = []
-    with ThreadPoolExecutor() as executor:
-        futures = []
-
-        # Zip clients with corresponding CSV files
-        for client, csv_path in zip(clients, csv_paths):
-            df = pd.read_csv(csv_path)
-            playlist_ids = df['playlistId'].tolist()
-            futures.append(executor.submit(process_songlist_for_client, client, df, playlist_ids))
-        
-        # Collect results and merge into a single list of dictionaries
-        for future in as_completed(futures):
-            try:
-                result = future.result()
-                if result:
-                    merged_list.extend(result)
-            except Exception as e:
-                logger.error(f"Error in parallel_songlist_request: {e}")
-    return merged_list
-
-# Merging the 6 lists into one and saving to a single CSV
-def write_merged_csv(merged_list):
-    for i in range(6): #remove sub_playlist_csv after merging
-        if os.path.exists(f"sub_playlist_{i+1}.csv"):
-            os.remove(f"sub_playlist_{i+1}.csv")
-            
-    if merged_list:
-        keys = merged_list[0].keys()
-        with open(f'data/spotify_category_songlist_{year}_{month}_{day}.csv', 'w', newline='', encoding='utf8') as f:
-            dict_writer = csv.DictWriter(f, keys)
-            dict_writer.writeheader()
-            dict_writer.writerows(merged_list)
-
-        os.remove(f"category_playlist_{year}_{month}_{day}.json")
-        os.remove(f"playlist_{year}_{month}_{day}.csv")
-        logger.info("Merged CSV written.")
-
-    else:
+# Request songlist() for every playlist of df: the 6 clients take playlists from one shared queue
+# the later tracks pages of a playlist are queued as soon as its first page gives the total, and fetched concurrently
+def parallel_songlist_request(df):
+    category_songlist = [] # built per run: the asset can run several times in one process
+    # key: (playlistId, tracks offset); a playlist in several categories / markets (one row each) is requested once,
+    # in the market of its first row, and its tracks are added for each of its rows
+    rows_of_playlist = {playlist_id: list(rows) for playlist_id, rows in df.groupby('playlistId', sort=False).groups.items()}
+    playlist_names = {}
+
+    def request(client, key):
+        playlist_id, offset = key
+        return songlist(client, playlist_id, offset, df.at[rows_of_playlist[playlist_id][0], 'market'])
+
+    def later_pages(key, items):
+        playlist_id, offset = key
+        if offset != 0 or not items or 'tracks' not in items:
+            return []
+        playlist_names[playlist_id] = items['name']
+        return [(playlist_id, page_offset) for page_offset in range(track_page_size, items['tracks'].get('total') or 0, track_page_size)]
+
+    for (playlist_id, offset), items in scheduler.run(request, [(playlist_id, 0) for playlist_id in rows_of_playlist],
+                                                      expand=later_pages):
+        if offset != 0 and items:
+            items = {"name": playlist_names[playlist_id], "tracks": items} # same shape as the first page
+        for i in rows_of_playlist[playlist_id]:
+            append_items(df, i, items, category_songlist)
+    logger.info(f"songlist: {len(rows_of_playlist)} unique playlists for {len(df)} (category, playlist) rows")
+
+    # playlists with a page that failed for good: replayed (whole) by the next run
+    failed_playlists = sorted({playlist_id for playlist_id, _ in scheduler.failed})
+    save_dead_letters("songlist", [{"category": df.at[i, 'category'], "playlistId": df.at[i, 'playlistId'], "market": df.at[i, 'market']}
+                                   for playlist_id in failed_playlists for i in rows_of_playlist[playlist_id]])
+    return category_songlist
+
+# The merged list as one DataFrame (stored by the spotify_parquet_io_manager)
+songlist_columns = ['category', 'playlistId', 'playlistName', 'artist', 'track', 'date_added', 'trackURL', 'id']
+
+def merged_dataframe(merged_list):
+    if not merged_list:
         logger.error("No data to write.")
         # raise Exception("No data to write.")
+    return pd.DataFrame(merged_list, columns=songlist_columns)
 
 # Main function
 @asset(
         group_name="step1_spotify_raw_data",
+        io_manager_key="spotify_parquet_io_manager",
 )
-def spotify_category_songlist():
+def spotify_category_songlist() -> pd.DataFrame:
     """
-    取得category->category playlist->songlist->csv
+    取得每個market (SPOTIFY_MARKETS) 的category->category playlist->songlist->DataFrame (spotify_parquet_io_manager存成parquet)
     """
     #非星期六則跳過
     # if datetime.today().weekday() != 5:
     #     logger.warning("星期六再來抓")
     #     exit(1)
 
-    #資料放在./data/
-    # generate_logger()裡面已經寫好創建data資料夾的程式碼
-    if not os.path.isdir('data'):
-        os.mkdir('data')
-
     # load_dotenv()
     logger.info("spotipy client initialized")
 
-    global category_lst
-
     category_lst = category()
-    sleep(3)
-    playlist()
-    sleep(3)
-    
-    df = pd.read_csv(f"playlist_{year}_{month}_{day}.csv", sep=",")
-    sub_csv_paths = split_playlist_csv(df, len(sp_client))
-    logger.info("split_playlist_csv done")
-
-    parallel_songlist_request(sp_client, sub_csv_paths)
-    if retries < 10:
-        logger.info("parallel_songlist_request done")
-    else:
-        logger.error("retries exceeded, skipping api request")
+    df = playlist(category_lst)
+
+    # replay the playlists that failed for good in the last run (dead letters without a market: the first market)
+    dead_letters = pd.DataFrame(load_dead_letters("songlist"), columns=["category", "playlistId", "market"])
+    dead_letters['market'] = dead_letters['market'].fillna(MARKETS[0])
+    df = pd.concat([df, dead_letters]).drop_duplicates(subset=["category", "playlistId"]).reset_index(drop=True)
+
+    category_songlist = parallel_songlist_request(df)
+    logger.info("parallel_songlist_request done")
 
-    write_merged_csv(category_songlist)
-    # logger.info("write_merged_csv done")
-    return 'done'
+    return merged_dataframe(category_songlist)
@@ -9,20 +9,20 @@ import numpy as np
 import csv
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from .prop import generate_logger, split_playlist_csv, initialize_sp_client, RetryLimitExceededError
-from .wait_between_assets import wait_between_assets
+from .prop import generate_logger, initialize_sp_client, RetryLimitExceededError
+from .scheduler import RequestScheduler, update_rate_state
+from .features_store import AudioFeaturesStore
+from .retry_policy import load_dead_letters, save_dead_letters
+from .wait_between_assets import wait_between_assets, clear_deferral_of, DEFERRED_RUN_TAG
 from dotenv import load_dotenv
-from dagster import asset
+from dagster import asset, Output, AssetExecutionContext
 
 #變數 =========================================================
-retries = 0
-
 year = datetime.now().year
 month = datetime.now().month
 day = datetime.now().day
 
 track = []
-audio_features = []
 items = None
 batch_size = 50
 
@@ -40,48 +40,16 @@ sp5 = initialize_sp_client(os.getenv("CLIENT_ID_5"), os.getenv("CLIENT_SECRET_5"
 sp6 = initialize_sp_client(os.getenv("CLIENT_ID_6"), os.getenv("CLIENT_SECRET_6"))
 
 sp_client = [sp1, sp2, sp3, sp4, sp5, sp6]
+# 所有請求經由scheduler分配給6個client (每個client一個token bucket)
+scheduler = RequestScheduler(sp_client, name="song_features")
 
 
 #general functions ============================================
-# Processing song features for each client and playlist segment
-def process_song_features_for_client(client, track_ids):
-    result_list = []
-    
-    # Process tracks in batches of 50 (Spotify's API limit)
-    batch_size = 50
-    for i in range(0, len(track_ids), batch_size):
-        track_batch = track_ids[i:i+batch_size]
-        items = song_features(client, track_batch)  # Call song_features() with the current batch of tracks
-        if items:
-            result_list.extend(items)
-    
-    return result_list
-
 def song_features(client: spotipy.Spotify, track_batch):
-    global retries
-    try:
-        items = client.audio_features(tracks=track_batch)
-        logger.debug(items)
-        append_items(items, audio_features)
-        return items
-    except spotipy.exceptions.SpotifyException as exc:
-        while retries < 10:
-            retries += 1
-            if exc.http_status == 429:
-                logger.error(f"{client}'s Rate limit exceeded")
-                sleep(5)
-            elif exc.http_status in (404, 500):
-                logger.error("Track not found or server error")
-                sleep(5)
-            else:
-                logger.error("Error")
-            return song_features(client, track_batch)
-    
-        # return None
-        # raise  RetryLimitExceededError("skipping api request")
-    except json.decoder.JSONDecodeError:
-        return None
-        
+    items = client.audio_features(tracks=list(track_batch))
+    logger.debug(items)
+    return items
+
 def append_items(items, audio_features):
     if items:
         # print(items)
@@ -89,54 +57,58 @@ def append_items(items, audio_features):
             audio_features.append(items[j])
     else:
         return None
-    sleep(20)
-
-# Parallel request to song_features() for each client and corresponding sub-CSV file
-def parallel_song_features_request(clients, csv_paths):
-    merged_list = []
-    with ThreadPoolExecutor() as executor:
-        futures = []
-
-        # Zip clients with corresponding CSV files
-        for client, csv_path in zip(clients, csv_paths):
-            df = pd.read_csv(csv_path)
-            track_ids = [url.split('/')[-1] for url in df['trackURL'].tolist()]  # Extract track IDs from track URLs
-            futures.append(executor.submit(process_song_features_for_client, client, track_ids))
-        
-        # Collect results and merge into a single list of dictionaries
-        for future in as_completed(futures):
-            try:
-                result = future.result()
-                if result:
-                    merged_list.extend(result)
-            except Exception as e:
-                logger.error(f"Error in parallel_song_features_request: {e}")
-    return merged_list 
-
-def write_csv(merged_list):
-    for i in range(6): #remove sub_playlist_csv after merging
-        if os.path.exists(f"sub_playlist_{i+1}.csv"):
-            os.remove(f"sub_playlist_{i+1}.csv")
-    
+
+# Request song_features() for every batch of 50 tracks (Spotify's API limit): the 6 clients take batches from one shared queue
+# audio features never change: tracks already in the AudioFeaturesStore are served from it, only new ids are requested
+# return: (audio features of this run, {"hits", "misses", "dead_letters"})
+def parallel_song_features_request(track_ids):
+    audio_features = [] # built per run: the asset can run several times in one process
+    # replay the tracks that failed for good in the last run (their features go to the store)
+    track_ids = list(dict.fromkeys(track_ids + load_dead_letters("song_features"))) # unique, in order
+    store = AudioFeaturesStore()
+    try:
+        stored = store.get_many(track_ids)
+        append_items(list(stored.values()), audio_features)
+
+        new_track_ids = [track_id for track_id in track_ids if track_id not in stored]
+        logger.info(f"audio features: {len(stored)} tracks from the store, {len(new_track_ids)} to request")
+
+        track_batches = [tuple(new_track_ids[i:i+batch_size]) for i in range(0, len(new_track_ids), batch_size)]
+        for track_batch, items in scheduler.run(song_features, track_batches):
+            append_items(items, audio_features)
+            if items:
+                store.put_many(items)
+
+        # batches that failed for good: their ids are replayed by the next run
+        dead_letters = [track_id for track_batch in scheduler.failed for track_id in track_batch]
+        save_dead_letters("song_features", dead_letters)
+        stats = {**store.stats(), "dead_letters": len(dead_letters)}
+    finally:
+        store.close()
+    return audio_features, stats
+
+def features_dataframe(merged_list):
+    merged_list = [features for features in merged_list if features] # audio_features is null for unknown tracks
     if merged_list:
         features_df = pd.json_normalize(merged_list)
-        features_df.to_csv(f'data/spotify_song_features_{year}_{month}_{day}.csv', index=False)
-        logger.info("write_csv done")
+        logger.info("features_dataframe done")
     else:
         #feature相關欄位都為空值
         features_df = pd.DataFrame(data=None, columns=['danceability', 'energy', 'key', 'loudness', 'mode', 'speechiness', 'acousticness', 'instrumentalness', 'liveness', 'valence', 'tempo', 'type', 'id', 'uri', 'track_href', 'analysis_url', 'duration_ms', 'time_signature'])
-        features_df.to_csv(f'data/spotify_song_features_{year}_{month}_{day}.csv', index=False)
         logger.error("merged_list is empty, writing null dataframe")
         # raise Exception("No data to write.")
+    return features_df
 
 # Main function
 @asset(
         group_name="step1_spotify_raw_data",
-        deps=[wait_between_assets]
+        deps=[wait_between_assets],
+        io_manager_key="spotify_parquet_io_manager",
 )
-def spotify_song_features():
+def spotify_song_features(context: AssetExecutionContext, spotify_category_songlist: pd.DataFrame) -> Output[pd.DataFrame]:
     """
-    調用從spotify_category_songlist取得的csv檔案->批量請求feature->寫入feature csv檔案
+    spotify_category_songlist (DataFrame)->批量請求feature->feature DataFrame (spotify_parquet_io_manager存成parquet)
+    metadata: store hits / misses, dead_letters (track ids replayed by the next run)
     """
     
     #初始化客戶端
@@ -144,17 +116,19 @@ def spotify_song_features():
 
     logger.info("Spotify clients initialized")
 
-    df = pd.read_csv(f'data/spotify_category_songlist_{year}_{month}_{day}.csv', sep=',')
-    sub_csv_paths = split_playlist_csv(df, len(sp_client))
-    logger.info("sub_csv_paths done")
+    df = spotify_category_songlist
+    track_ids = [url.split('/')[-1] for url in df['trackURL'].tolist()]  # Extract track IDs from track URLs
 
     # Perform parallel requests for song features and merge the results
-    merged_song_features = parallel_song_features_request(sp_client, sub_csv_paths)
-    if retries < 10:
-        logger.info("parallel_request done")
-    else:
-        logger.error("retries exceeded, skipping api request")
+    merged_song_features, stats = parallel_song_features_request(track_ids)
+    logger.info("parallel_request done")
+    features_df = features_dataframe(merged_song_features)
+
+    # 由 trigger_spotify_song_features 觸發的run: features已取得，才清除deferral (run失敗時保留)
+    deferred_run_id = context.run.tags.get(DEFERRED_RUN_TAG)
+    if deferred_run_id is not None:
+        update_rate_state(clear_deferral_of(deferred_run_id))
+        logger.info(f"deferral of run {deferred_run_id} cleared")
 
-    write_csv(merged_song_features)
-    return 'done'
+    return Output(features_df, metadata=stats)
         
\ No newline at end of file
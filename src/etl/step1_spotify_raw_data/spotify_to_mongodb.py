@@ -1,6 +1,6 @@
 import pandas as pd
-import re, json, csv, pymongo
-from pymongo import MongoClient
+import re, json, csv, math, pymongo
+from pymongo import MongoClient, UpdateOne, DeleteOne
 from pymongo.errors import AutoReconnect
 from datetime import datetime
 from dotenv import load_dotenv
@@ -9,7 +9,7 @@ from dagster import asset
 import pymongo.collection
 import pymongo.database
 from .prop import generate_logger
-from .spotify_song_features import spotify_song_features
+from snapshot_catalog import record_snapshot, WRITING, COMPLETE, FAILED
 from retry import retry
 
 #變數 =======================================================
@@ -20,38 +20,39 @@ load_dotenv(dotenv_path='step1_spotify_raw_data/sp.env')
 year = datetime.now().year
 month = str(datetime.now().month) if datetime.now().month >= 10 else f'0{datetime.now().month}'
 day = str(datetime.now().day) if datetime.now().day >= 10 else f'0{datetime.now().day}'
+
+# mongoimport: rows per insert_many
+CHUNK_SIZE = int(os.getenv('SPOTIFY_MONGO_CHUNK_SIZE', 1000))
+# audio feature columns stored as numbers
+NUMERIC_COLUMNS = {
+    'danceability': float, 'energy': float, 'key': int, 'loudness': float, 'mode': int,
+    'speechiness': float, 'acousticness': float, 'instrumentalness': float, 'liveness': float,
+    'valence': float, 'tempo': float, 'duration_ms': int, 'time_signature': int,
+}
 #general functions ==========================================
-def merge_csv():
+def merge_data(song: pd.DataFrame, feature: pd.DataFrame):
     """
-    歌單csv和特徵csv合併
+    歌單和特徵合併 (spotify_category_songlist, spotify_song_features的DataFrame)
     """
-    song_file = f'data/spotify_category_songlist_{year}_{month}_{day}.csv'
-    feature_file = f'data/spotify_song_features_{year}_{month}_{day}.csv'
-
-    if os.path.exists(song_file) and os.path.exists(feature_file):
-
-        song = pd.read_csv(song_file, sep=',')
-        feature = pd.read_csv(feature_file, sep=',')
-        feature = feature.drop_duplicates()
-
-        song['id'] = song['trackURL'].str.split('/').str[-1]
+    feature = feature.drop_duplicates()
 
-        merged = pd.merge(song, feature, how='left', on='id', validate='many_to_one')
+    song = song.copy()
+    song['id'] = song['trackURL'].str.split('/').str[-1]
 
-        merged['fetchDate'] = f'{year}-{month}-{day} 00:00:00'
+    merged = pd.merge(song, feature, how='left', on='id', validate='many_to_one')
 
-        filename = f'data/spotify_merged_{year}_{month}_{day}.csv'
-        merged.to_csv(f'{filename}', index=False)
-        logger.info(f"csv file {filename} created")
+    merged['fetchDate'] = f'{year}-{month}-{day} 00:00:00'
+    logger.info(f"merged: {len(merged)} rows")
+    return merged
 
-        os.remove(song_file)
-        os.remove(feature_file)
+def iter_rows(df: pd.DataFrame, chunk_size: int):
+    """
+    DataFrame -> row dicts, chunk by chunk (缺值 -> '', 與之前的csv一致)
+    """
+    for start in range(0, len(df), chunk_size):
+        chunk = df.iloc[start:start + chunk_size].astype(object)
+        yield from chunk.where(chunk.notna(), '').to_dict(orient='records')
 
-        return filename
-    else:
-        logger.error("songlist or feature csv files not found")
-        # raise FileNotFoundError("songlist or feature csv files not found")
-    
 @retry(AutoReconnect, tries=3, delay=3)
 def connect_to_mongo():
     """
@@ -62,78 +63,114 @@ def connect_to_mongo():
 
     return client
 
-def mongoimport(csv_path: str, db_name: pymongo.database.Database, coll_name: pymongo.collection.Collection):
-    """ Imports a csv file at path csv_name to a mongo colection
-    return: the amount of rows inserted
+def parse_artist(artist_str: str):
+    """
+    artist欄位 -> list of {"name": ...}
+    spotify_category_songlist寫入json; 舊的csv是python repr (單引號, None)，修正後再轉json
+    raise ValueError if it can not be parsed
+    """
+    try:
+        return json.loads(artist_str)
+    except json.JSONDecodeError:
+        pass
+
+    artist_str = artist_str.replace('None', 'null')
+    artist_str = artist_str.replace("''", 'null')
+
+    # 替換鍵的單引號為雙引號
+    corrected_artist = re.sub(r"([{,]\s*)'([^']+)'(\s*:)", r'\1"\2"\3', artist_str)
+
+    # 替換值的單引號為雙引號
+    corrected_artist = re.sub(r":\s*'([^']*)'", r': "\1"', corrected_artist)
+    # 處理 value 中間的雙引號，但保留外層雙引號
+    corrected_artist = re.sub(r'"\s*([^"]+?)\s*"', r'"\1"', corrected_artist)
+
+    return json.loads(corrected_artist)
+
+def to_typed_row(row: dict):
+    """
+    數值欄位 str -> int / float, 空值 -> None
+    (merge後有缺值的int欄位會被寫成 "5.0"，先轉float)
+    """
+    for column, to_type in NUMERIC_COLUMNS.items():
+        if column in row:
+            try:
+                value = float(row[column])
+                row[column] = None if math.isnan(value) else to_type(value)
+            except (TypeError, ValueError):
+                row[column] = None
+    return row
+
+def mongoimport(rows, db_name: pymongo.database.Database, coll_name: pymongo.collection.Collection):
+    """ Imports rows (iterable of dicts, e.g. iter_rows(merged)) to a mongo colection
+    - rows are inserted in chunks of CHUNK_SIZE (unordered insert_many) into a staging collection,
+      which is then renamed over the collection: readers (trigger_step2) never see it empty or half-written,
+      and a failed import leaves the previous data in place
+    - artist is stored as json (list of {"name": ...}); rows whose artist can not be parsed are skipped
+    - audio feature columns are stored as numbers
+    - errors are logged and raised (the staging collection is dropped by the next import)
+    return: the amount of rows inserted (0: nothing to import, the collection is not replaced)
     """
     db = db_name
     collection = coll_name
+    staging = db[f"{collection.name}_staging"]
 
     count = 0
     try:
-        with open(csv_path, newline='', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            rows = list(reader)
-            #覆蓋資料: 若collection有資料則刪除所有資料再寫入
-            if collection.count_documents({}) > 0:
-                collection.delete_many({})
-                count = len(rows)
-            if rows:
-                collection.insert_many(rows)
-                count = len(rows)
-        logger.info(f"csv file {csv_path} imported to mongodb")
+        staging.drop() # leftover of a failed import
+        chunk = []
+        for row in rows:
+            try:
+                row['artist'] = parse_artist(row['artist'])
+            except ValueError:
+                continue
+            chunk.append(to_typed_row(row))
+            if len(chunk) >= CHUNK_SIZE:
+                staging.insert_many(chunk, ordered=False)
+                count += len(chunk)
+                chunk = []
+        if chunk:
+            staging.insert_many(chunk, ordered=False)
+            count += len(chunk)
+
+        if count:
+            #覆蓋資料: staging collection rename成正式collection (原有資料一起被取代)
+            staging.rename(collection.name, dropTarget=True)
+            logger.info(f"{count} rows imported to {collection.name}")
+        else:
+            staging.drop()
+            logger.error(f"no rows to import, {collection.name} not replaced")
     except pymongo.errors.ServerSelectionTimeoutError as e:
-        logger.error(f"Error importing csv file {csv_path}: {e}")
+        logger.error(f"Error importing to {collection.name}: {e}")
+        raise
     except Exception as e:
-        logger.error(f"Unexpected error importing csv file {csv_path}: {e}")
+        logger.error(f"Unexpected error importing to {collection.name}: {e}")
+        raise
     return count
 
 def process_artist():
     """
-    處理artist欄位
+    處理artist欄位: 只處理artist還是字串的document (舊格式)，一次bulk_write
+    (mongoimport已經把artist存成json，一般不會有需要處理的document)
     """
-
-    none_pattern = re.compile(r"None\b")
-
-    for doc in collection.find({}):
-        artist_str = doc['artist']
-        track_str = doc['track']
-
-        artist_str = artist_str.replace('None', 'null')
-        artist_str = artist_str.replace("''", 'null')
-
-        # 替換鍵的單引號為雙引號
-        corrected_artist = re.sub(r"([{,]\s*)'([^']+)'(\s*:)", r'\1"\2"\3', artist_str)
-
-        # 替換值的單引號為雙引號
-        corrected_artist = re.sub(r":\s*'([^']*)'", r': "\1"', corrected_artist)
-        # 處理 value 中間的雙引號，但保留外層雙引號
-        corrected_artist = re.sub(r'"\s*([^"]+?)\s*"', r'"\1"', corrected_artist)
-    
-        # 檢查完全空的情況：""
-        if corrected_artist.strip() == "":
-            corrected_artist = none_pattern.sub('null', corrected_artist)
-
-        elif track_str.strip() == "":
-            track_str = none_pattern.sub('null', track_str)
-
+    operations = []
+    for doc in collection.find({'artist': {'$type': 'string'}}, {'artist': 1}):
         try:
-            # 更新 artist 欄位並保存
-            artist_json = json.loads(corrected_artist)
-            collection.update_one({'_id': doc['_id']}, {'$set': {'artist': artist_json, 'track': track_str}})
-        except Exception:
-            collection.delete_one({'_id': doc['_id']})
+            operations.append(UpdateOne({'_id': doc['_id']}, {'$set': {'artist': parse_artist(doc['artist'])}}))
+        except ValueError:
+            operations.append(DeleteOne({'_id': doc['_id']}))
 
-    logger.info("artist field processed")
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+    logger.info(f"artist field processed: {len(operations)} documents")
 
 # Main function
 @asset(
     group_name="step1_spotify_raw_data",
-    deps=[spotify_song_features]
 )
-def spotify_to_mongodb():
+def spotify_to_mongodb(spotify_category_songlist: pd.DataFrame, spotify_song_features: pd.DataFrame):
     """
-    songlist與feature合併後存入mongodb->artist欄位轉json
+    songlist與feature (spotify_parquet_io_manager的parquet) 在記憶體合併後存入mongodb->artist欄位轉json
     """
 
     # load_dotenv()
@@ -148,15 +185,22 @@ def spotify_to_mongodb():
         logger.error(f"Error connecting to MongoDB: {e}")
         # exit(1)
 
-    filename = merge_csv()
-
-    mongoimport(filename, db, collection)
-
-    if os.path.exists(filename):
-        os.remove(filename)
-        logger.info(f"csv file {filename} deleted")
-
-    process_artist()
+    # snapshot catalog: "writing" during the import, step2 reads the collection once it is complete
+    date = f'{year}{month}{day}'
+    record_snapshot(db, "spotify", collection.name, date, WRITING)
+    try:
+        merged = merge_data(spotify_category_songlist, spotify_song_features)
+
+        count = mongoimport(iter_rows(merged, CHUNK_SIZE), db, collection)
+        if not count:
+            raise RuntimeError(f"no rows imported to {collection.name}")
+
+        process_artist()
+    except BaseException:
+        # the run fails (dagster reports the materialization as failed)
+        record_snapshot(db, "spotify", collection.name, date, FAILED)
+        raise
+    record_snapshot(db, "spotify", collection.name, date, COMPLETE, rows=count)
 
     client.close()
     return 'done'
\ No newline at end of file
@@ -1,19 +1,55 @@
-from dagster import asset
+from dagster import asset, Output, AssetExecutionContext
 from .prop import generate_logger
-from time import sleep
+from .scheduler import load_rate_state, update_rate_state, budget_ready_at
+from time import sleep, time
+from datetime import datetime
+import os
 from .spotify_category_songlist import spotify_category_songlist
 # 變數 ==========================================
 logger = generate_logger(__file__)
 
+# rate budget 在這個秒數內恢復 -> 在同一個run裡等待; 否則延後，由 trigger_spotify_song_features sensor 觸發
+MAX_INLINE_WAIT = int(os.getenv('SPOTIFY_MAX_INLINE_WAIT', 300))
+
+# trigger_spotify_song_features 觸發的run: tag記錄延後它的run id
+DEFERRED_RUN_TAG = "spotify/deferred_run_id"
+
+# 不再延後: 清除deferral
+def clear_deferral(state):
+    state.pop("deferred_date", None)
+    state.pop("deferred_run_id", None)
+
+# 延後的spotify_song_features完成: 清除它的deferral (除非之後的run又延後了)
+def clear_deferral_of(deferred_run_id):
+    def clear(state):
+        if state.get("deferred_run_id", state.get("deferred_date")) == deferred_run_id:
+            clear_deferral(state)
+    return clear
+
 # main function =================================
 @asset(
     group_name="step1_spotify_raw_data",
     deps=[spotify_category_songlist],
+    output_required=False,
 )
-def wait_between_assets():
+def wait_between_assets(context: AssetExecutionContext):
     """
-    請求完spotify_category_songlist後，等待3小時再請求spotify_song_features
+    請求完spotify_category_songlist後，依照每個client保存的rate-limit狀態(spotify_rate_state.json)決定何時請求spotify_song_features
+    - budget 已恢復(或MAX_INLINE_WAIT秒內恢復): 等待後直接繼續 spotify_song_features
+    - budget 用完: 記錄deferred_date, deferred_run_id並結束(下游asset跳過)，由 trigger_spotify_song_features sensor 在budget恢復後觸發
     """
-    logger.info("wait_between_assets")
-    sleep(10800)
-    logger.info("wait_between_assets done")
\ No newline at end of file
+    today = datetime.today().strftime('%Y%m%d')
+    wait = budget_ready_at(load_rate_state()) - time()
+
+    if wait <= MAX_INLINE_WAIT:
+        if wait > 0:
+            logger.info(f"wait_between_assets: rate budget ready in {wait:.0f} sec")
+            sleep(wait)
+        update_rate_state(clear_deferral)
+        logger.info("wait_between_assets done")
+        yield Output('done', metadata={"waited_sec": round(max(wait, 0), 1)})
+    else:
+        update_rate_state(lambda state: state.update(deferred_date=today, deferred_run_id=context.run_id))
+        ready_at = datetime.fromtimestamp(time() + wait).strftime('%Y-%m-%d %H:%M:%S')
+        logger.warning(f"wait_between_assets: rate budget exhausted until {ready_at}, spotify_song_features deferred")
+        context.log.warning(f"rate budget exhausted until {ready_at}: spotify_song_features deferred to the sensor")
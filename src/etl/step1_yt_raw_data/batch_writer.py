@@ -0,0 +1,193 @@
+import asyncio
+import csv
+import json
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# row formats ==========================================================
+def write_csv_rows(f, rows):
+    csv.writer(f).writerows(rows)
+
+
+# rows are (key, value) -> {"key": key, "value": value} per line
+def write_jsonl_rows(f, rows):
+    f.writelines(
+        json.dumps({"key": key, "value": value}, ensure_ascii=False, separators=(",", ":")) + "\n"
+        for key, value in rows
+    )
+
+
+# batched writer threads ===============================================
+class QueueWriter:
+    """
+    Base of the batched writers (BatchWriter: one file, MongoSink: one mongo collection).
+    Producers put items into a queue; writer threads drain it and pass batches of up to batch_size items
+    to write_batch. A batch is also written flush_interval sec after its first item, even if it is not full.
+
+    put never blocks, so the crawl coroutines can call it on the event loop.
+    The queue is bounded by drain(): a coroutine awaits it after its puts, and waits (off the event loop)
+    while more than max_queue items are queued.
+    After a failed write the writer keeps draining without writing, and the next put raises.
+    close() writes what is left, and checks that every item put was written.
+    """
+
+    _STOP = object()
+
+    def __init__(self, name, batch_size=500, flush_interval=10.0, max_queue=10000, threads=1):
+        self.name = name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.threads = threads
+        self.items_put = 0
+        self.items_written = 0
+        self._queue = queue.Queue()
+        self._count_lock = threading.Lock()
+        self._room = threading.Condition()
+        self._threads = []
+        self._error = None
+
+    def write_batch(self, batch):
+        """
+        Write one batch, return the number of items written (raise: the writer failed).
+        """
+        raise NotImplementedError
+
+    def _closed(self):
+        # after the writer threads stopped
+        pass
+
+    def start(self):
+        self._threads = [threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+                         for i in range(self.threads)]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def put(self, item):
+        """
+        Queue one item, without blocking (see drain).
+        """
+        if self._error is not None:
+            raise RuntimeError(f"{self.name} failed: {self._error}")
+        with self._count_lock:
+            self.items_put += 1
+        self._queue.put_nowait(item)
+
+    async def drain(self):
+        """
+        Backpressure: wait until at most max_queue items are queued, in a worker thread.
+        """
+        if self._queue.qsize() > self.max_queue:
+            await asyncio.get_running_loop().run_in_executor(None, self._wait_for_room)
+
+    def _wait_for_room(self):
+        with self._room:
+            self._room.wait_for(lambda: self._queue.qsize() <= self.max_queue or not self._threads)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            # wait for the first item, then collect until the batch is full or flush_interval has passed
+            item = self._queue.get()
+            if item is self._STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._write(batch)
+
+    def _write(self, batch):
+        if self._error is None:
+            try:
+                written = self.write_batch(batch)
+                with self._count_lock:
+                    self.items_written += written
+            except Exception as e:
+                # keep draining, so coroutines waiting in drain() are released
+                logger.error(f"Error writing to {self.name}: {e}")
+                self._error = e
+        with self._room:
+            self._room.notify_all()
+
+    def close(self):
+        """
+        Write the remaining items, stop the writer threads and check the item count.
+        """
+        if not self._threads:
+            return
+        for _ in self._threads:
+            self._queue.put(self._STOP)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self._closed()
+        with self._room:
+            self._room.notify_all()
+
+        if self._error is not None:
+            raise RuntimeError(f"{self.name} failed: {self._error}")
+        if self.items_written != self.items_put:
+            raise RuntimeError(f"{self.name}: {self.items_put} items queued but {self.items_written} written")
+        logger.info(f"{self.name}: {self.items_written} items written")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+# single file writer ===================================================
+class BatchWriter(QueueWriter):
+    """
+    The only writer of one output file: one writer thread, one open file handle, flushed after every batch.
+
+    usage:
+        with BatchWriter(path, write_csv_rows, header_rows=[["lyricsId", "lyrics", "lyricsSource"]]) as writer:
+            writer.put([lyrics_id, lyrics, source])
+            await writer.drain()
+    """
+
+    def __init__(self, path, write_rows, mode='a', header_rows=None, batch_size=500,
+                 flush_interval=10.0, max_queue=10000):
+        super().__init__(f"writer of {path}", batch_size=batch_size, flush_interval=flush_interval,
+                         max_queue=max_queue)
+        self.path = path
+        self.write_rows = write_rows
+        self.mode = mode
+        self.header_rows = header_rows
+        self._file = None
+
+    def start(self):
+        # newline='' keeps csv line endings as written by the csv module
+        self._file = open(self.path, self.mode, newline='', encoding='utf-8')
+        if self.header_rows:
+            self.write_rows(self._file, self.header_rows)
+            self._file.flush()
+        return super().start()
+
+    def write_batch(self, batch):
+        self.write_rows(self._file, batch)
+        self._file.flush()
+        return len(batch)
+
+    def _closed(self):
+        self._file.close()
+        self._file = None
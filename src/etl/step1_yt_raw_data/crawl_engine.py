@@ -0,0 +1,219 @@
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+# adaptive concurrency (AIMD) ==========================================
+class AdaptiveLimiter:
+    """
+    Concurrency window for one endpoint, tuned with AIMD:
+        - every healthy response grows the window by ~1 per window of calls (additive increase)
+        - an error, or a response much slower than the observed baseline, shrinks it (multiplicative decrease)
+    At most one decrease is applied per window of completed calls, so one burst of errors only backs off once.
+    """
+
+    def __init__(self, endpoint, initial=6, minimum=1, maximum=32,
+                 decrease_factor=0.5, latency_tolerance=3.0, ewma_alpha=0.2):
+        self.endpoint = endpoint
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.ewma_alpha = ewma_alpha
+
+        self.in_flight = 0
+        self.calls = 0
+        self.errors = 0
+        self.ewma_latency = None
+        self.baseline_latency = None
+        self._since_decrease = 0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self, latency, ok):
+        async with self._cond:
+            self.in_flight -= 1
+            self.calls += 1
+            self._since_decrease += 1
+
+            if ok:
+                self._observe_latency(latency)
+            else:
+                self.errors += 1
+
+            if not ok or self._is_slow(latency):
+                self._decrease()
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+            self._cond.notify_all()
+
+    def _observe_latency(self, latency):
+        if self.ewma_latency is None:
+            self.ewma_latency = latency
+        else:
+            self.ewma_latency = self.ewma_alpha * latency + (1 - self.ewma_alpha) * self.ewma_latency
+        # baseline: the best smoothed latency seen so far, i.e. latency of a healthy backend
+        if self.baseline_latency is None or self.ewma_latency < self.baseline_latency:
+            self.baseline_latency = self.ewma_latency
+
+    def _is_slow(self, latency):
+        if self.baseline_latency is None:
+            return False
+        return latency > self.baseline_latency * self.latency_tolerance
+
+    def _decrease(self):
+        if self._since_decrease < self.limit:
+            return # already backed off for this window
+        old_limit = self.limit
+        self.limit = max(self.minimum, self.limit * self.decrease_factor)
+        self._since_decrease = 0
+        logger.info(f"[{self.endpoint}] backing off: concurrency {old_limit:.1f} -> {self.limit:.1f}")
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "concurrency": round(self.limit, 2),
+            "ewma_latency_sec": round(self.ewma_latency, 3) if self.ewma_latency is not None else None,
+        }
+
+
+# crawl engine =========================================================
+class CrawlEngine:
+    """
+    Shared scheduler for all YTMusic calls of one crawl.
+    The blocking ytmusicapi calls run on one thread pool (the global bound),
+    and each endpoint gets its own AdaptiveLimiter inside that bound.
+    With a ResponseCache, cached endpoints are answered from disk first, and only misses reach the network;
+    the cache is read and written on one cache thread, so the sqlite I/O never blocks the event loop.
+    With projections ({endpoint: func}), each response is reduced to the needed fields on the worker thread,
+    before it is cached or returned.
+
+    usage:
+        async with CrawlEngine(ytmusic) as engine:
+            song = await engine.call("get_song", video_id)
+            tw_moods = await engine.call("get_mood_categories", client=ytmusic_tw) # another YTMusic (location)
+    """
+
+    def __init__(self, client, max_concurrency=32, initial_concurrency=6, min_concurrency=1,
+                 cache=None, projections=None):
+        self.client = client
+        self.cache = cache
+        self.projections = projections or {}
+        self.max_concurrency = max_concurrency
+        self.initial_concurrency = initial_concurrency
+        self.min_concurrency = min_concurrency
+        self._limiters = {}
+        self._executor = None
+        self._cache_executor = None
+        self._slots = None
+
+    async def __aenter__(self):
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="ytmusic")
+        # own thread: cache lookups don't queue behind slow api calls
+        self._cache_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ytmusic-cache")
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        executors, self._executor, self._cache_executor = [self._executor, self._cache_executor], None, None
+        for executor in executors:
+            if exc_type is not None:
+                # error / cancellation: drop the queued calls, don't wait for the in-flight ones
+                executor.shutdown(wait=False, cancel_futures=True)
+            else:
+                # wait for the in-flight calls off the event loop, so other tasks keep running
+                await asyncio.get_running_loop().run_in_executor(None, executor.shutdown)
+
+    def limiter(self, endpoint):
+        if endpoint not in self._limiters:
+            self._limiters[endpoint] = AdaptiveLimiter(
+                endpoint,
+                initial=min(self.initial_concurrency, self.max_concurrency),
+                minimum=self.min_concurrency,
+                maximum=self.max_concurrency,
+            )
+        return self._limiters[endpoint]
+
+    async def call(self, endpoint, *args, client=None, **kwargs):
+        """
+        Run ytmusic.<endpoint>(*args, **kwargs) on the shared pool. Exceptions are re-raised to the caller.
+        client: another YTMusic instance (e.g. another location) to call instead of the engine's; not cached.
+        """
+        if client is not None:
+            return await self._call_api(endpoint, *args, client=client, **kwargs)
+
+        use_cache = self.cache is not None and self.cache.is_cached(endpoint) and len(args) == 1 and not kwargs
+        if use_cache:
+            hit, value = await self._run_cache(self.cache.get, endpoint, args[0])
+            if hit:
+                # entries cached before projection was added are still full responses
+                return self._project(endpoint, value)
+
+        result = await self._call_api(endpoint, *args, **kwargs)
+        if use_cache:
+            await self._run_cache(self.cache.put, endpoint, args[0], result)
+        return result
+
+    async def _run_cache(self, func, *args):
+        # sqlite read / write (and json decode / encode) on the cache thread
+        return await asyncio.get_running_loop().run_in_executor(self._cache_executor, func, *args)
+
+    def _project(self, endpoint, response):
+        projection = self.projections.get(endpoint)
+        if projection is None or response is None:
+            return response
+        return projection(response)
+
+    def _fetch(self, client, endpoint, *args, **kwargs):
+        # runs on the worker thread
+        response = getattr(client, endpoint)(*args, **kwargs)
+        return self._project(endpoint, response)
+
+    async def _call_api(self, endpoint, *args, client=None, **kwargs):
+        limiter = self.limiter(endpoint)
+        func = functools.partial(self._fetch, client or self.client, endpoint, *args, **kwargs)
+        loop = asyncio.get_running_loop()
+
+        await limiter.acquire()
+        ok = False
+        start_time = time.monotonic()
+        try:
+            async with self._slots:
+                start_time = time.monotonic()
+                result = await loop.run_in_executor(self._executor, func)
+            ok = True
+            return result
+        finally:
+            await limiter.release(time.monotonic() - start_time, ok)
+
+    async def map(self, endpoint, keys, error_value=None, client=None):
+        """
+        Call endpoint once per key concurrently. Return {key: response}; failed keys map to error_value.
+        """
+        async def call_one(key):
+            try:
+                return key, await self.call(endpoint, key, client=client)
+            except Exception as e:
+                logger.error(f"Error calling {endpoint} for {key}: {e}")
+                return key, error_value
+
+        results = await asyncio.gather(*(call_one(key) for key in keys))
+        return dict(results)
+
+    def stats(self):
+        stats = {endpoint: limiter.stats() for endpoint, limiter in self._limiters.items()}
+        if self.cache is not None:
+            for endpoint, cache_stats in self.cache.stats().items():
+                stats.setdefault(endpoint, {}).update(cache_stats)
+        return stats
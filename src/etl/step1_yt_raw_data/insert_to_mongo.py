@@ -4,6 +4,7 @@ from datetime import datetime
 from dagster import asset, AssetIn
 import os
 from dotenv import load_dotenv
+from snapshot_catalog import record_snapshot, WRITING, COMPLETE, FAILED
 
 load_dotenv(dotenv_path='step1_yt.env')
 
@@ -18,6 +19,18 @@ MONGO_PORT = os.getenv('MONGO_PORT')
 MONGO_USERNAME = os.getenv('MONGO_USERNAME')
 MONGO_PASSWORD = os.getenv('MONGO_PASSWORD')
 MONGO_DB = os.getenv('MONGO_DB')
+# direct ingestion: ytmusicapi_tojson streams yt_category_songlist records into mongo while crawling
+# (streaming crawl mode only); the csv files are then optional debug artifacts and this asset skips
+YT_DIRECT_MONGO = os.getenv('YT_DIRECT_MONGO', '0') == '1'
+
+
+def get_mongo_client():
+    # mongo connection - local host
+    # return MongoClient(f'mongodb://{MONGO_HOST}:{MONGO_PORT}/')
+
+    # mongo connection - connection to service
+    return MongoClient(f'mongodb://{MONGO_USERNAME}:{MONGO_PASSWORD}@{MONGO_HOST}:{MONGO_PORT}/')
+
 
 @asset(
     group_name="step1_yt_raw_data",
@@ -28,25 +41,35 @@ MONGO_DB = os.getenv('MONGO_DB')
 def insert_to_mongo():
     """
     insert yt csv to mongo
+    (skipped with YT_DIRECT_MONGO=1: the records were already inserted by ytmusicapi_tojson)
     """
-    
-    # mongo connection - local host
-    # client = MongoClient(f'mongodb://{MONGO_HOST}:{MONGO_PORT}/')
+    if YT_DIRECT_MONGO:
+        print(f"Mongo insert skipped: yt_category_songlist_{today} was filled by the crawl (YT_DIRECT_MONGO=1)")
+        return
 
-    # mongo connection - connection to service
-    client = MongoClient(f'mongodb://{MONGO_USERNAME}:{MONGO_PASSWORD}@{MONGO_HOST}:{MONGO_PORT}/')
+    client = get_mongo_client()
     db = client[MONGO_DB]
 
 
     # yt_category_songlist.csv -> mongo
     current_collection = db[f"yt_category_songlist_{today}"]  
     csv_file = f"{absolute_data_path_dir}/yt_category_songlist.csv"  
+
+    # snapshot catalog: readers wait for "complete"
+    record_snapshot(db, "yt", current_collection.name, today, WRITING)
     
     # batch insert to mongoDB
     chunksize = 1000
-    for chunk in pd.read_csv(csv_file, chunksize=chunksize):
-        data = chunk.to_dict(orient="records")
-        current_collection.insert_many(data)
+    rows = 0
+    try:
+        for chunk in pd.read_csv(csv_file, chunksize=chunksize):
+            data = chunk.to_dict(orient="records")
+            current_collection.insert_many(data)
+            rows += len(data)
+    except BaseException:
+        record_snapshot(db, "yt", current_collection.name, today, FAILED)
+        raise
+    record_snapshot(db, "yt", current_collection.name, today, COMPLETE, rows=rows)
 
     print(f"Mongo insert done: {absolute_data_path_dir}/yt_category_songlist.csv")
 
@@ -0,0 +1,140 @@
+import csv
+import json
+import logging
+import os
+
+from .batch_writer import BatchWriter, write_csv_rows, write_jsonl_rows
+
+logger = logging.getLogger(__name__)
+
+
+# error markers written by the crawl, e.g. "get_song_error"
+def is_error_value(value):
+    return isinstance(value, str) and value.endswith('_error')
+
+
+def _repair_tail(path):
+    # a crash can leave a half-written last line: end it, so the next append starts on a new line
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        with open(path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            last_byte = f.read(1)
+        if last_byte != b'\n':
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write('\n')
+
+
+class StageJournal:
+    """
+    Append-only jsonl journal of one crawl stage: one {"key": id, "value": response} line per completed id.
+        - the journal is the stage output (read by json_tocsv.iter_json_items)
+        - on open, ids already journaled with a non-error value are marked done, so a re-run skips them
+          (ids journaled with an error marker are fetched again)
+        - lines go through a BatchWriter: one writer thread, flushed every flush_every lines
+          or flush_interval sec, not only at the end of the stage
+        - append never blocks; coroutines await drain() after appending (backpressure)
+    """
+
+    write_rows = staticmethod(write_jsonl_rows)
+
+    def __init__(self, path, flush_every=100, flush_interval=10.0):
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.completed = set()
+        self._writer = None
+
+    def _load_completed(self):
+        for key, value in self.items():
+            if is_error_value(value):
+                self.completed.discard(key)
+            else:
+                self.completed.add(key)
+
+    def _header_rows(self):
+        return None
+
+    def open(self):
+        _repair_tail(self.path)
+        self._load_completed()
+        if self.completed:
+            logger.info(f"resuming {os.path.basename(self.path)}: {len(self.completed)} ids already done")
+
+        self._writer = BatchWriter(self.path, self.write_rows, mode='a',
+                                   header_rows=self._header_rows(),
+                                   batch_size=self.flush_every,
+                                   flush_interval=self.flush_interval).start()
+        return self
+
+    def items(self):
+        """
+        Iterate (key, value) of all journaled lines, skipping a corrupted (half-written) line.
+        """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"skipping corrupted line in {self.path}")
+                    continue
+                yield item["key"], item["value"]
+
+    def is_done(self, key):
+        return key in self.completed
+
+    async def drain(self):
+        await self._writer.drain()
+
+    def append(self, key, value):
+        self._writer.put((key, value))
+        if not is_error_value(value):
+            self.completed.add(key)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class CsvJournal(StageJournal):
+    """
+    Same as StageJournal, for a csv output whose first column is the id (lyrics.csv).
+    append(key, row) takes the whole csv row.
+    """
+
+    write_rows = staticmethod(write_csv_rows)
+
+    def __init__(self, path, header, flush_every=100, flush_interval=10.0):
+        super().__init__(path, flush_every=flush_every, flush_interval=flush_interval)
+        self.header = header
+
+    def _load_completed(self):
+        self.completed = {key for key, _ in self.items()}
+
+    def _header_rows(self):
+        is_new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        return [self.header] if is_new else None
+
+    def items(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader, None) # header
+            for row in reader:
+                if row:
+                    yield row[0], row
+
+    def append(self, key, row):
+        self._writer.put(row)
+        self.completed.add(key)
@@ -1,9 +1,20 @@
 from pprint import pprint
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import json
 from datetime import datetime
 import os
 from dagster import asset, AssetIn
+from .schemas import (
+    MOOD_CATEGORIES_SCHEMA,
+    MOOD_PLAYLIST_SCHEMA,
+    PLAYLIST_SONGS_SCHEMA,
+    SONGS_DETAILS_SCHEMA,
+    WATCH_PLAYLIST_FOR_LYRICS_SCHEMA,
+    LYRICS_SCHEMA,
+)
+from .records import playlist_song_rows, song_details_row
 
 today = datetime.today().strftime('%Y%m%d')
 # today = '20241030_test_minimize'
@@ -19,8 +30,36 @@ def load_from_json(filepath):
             return json.load(f)
     return None
 
-# mood_categories.json -> csv
-def mood_categories_json_tocsv():
+# iterate (key, value) of a crawl output: name.jsonl (streaming crawl) or name.json (staged crawl),
+# whichever was written last. .jsonl is read line by line, so the whole file is never in memory.
+def iter_json_items(name):
+    json_path = f"{absolute_data_path_dir}/{name}.json"
+    jsonl_path = f"{absolute_data_path_dir}/{name}.jsonl"
+    candidates = [path for path in (json_path, jsonl_path) if os.path.exists(path)]
+    if not candidates:
+        return
+    latest_path = max(candidates, key=os.path.getmtime)
+
+    if latest_path == jsonl_path:
+        with open(jsonl_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError: # half-written line of an interrupted crawl
+                    continue
+                yield item["key"], item["value"]
+    else:
+        yield from load_from_json(json_path).items()
+
+# write rows to data/today/<table>.parquet with the table's explicit schema
+def write_parquet(result_data, schema, table_name):
+    table = pa.Table.from_pylist(result_data, schema=schema)
+    pq.write_table(table, f"{absolute_data_path_dir}/{table_name}.parquet")
+
+# mood_categories.json -> parquet
+def mood_categories_json_toparquet():
     data = load_from_json(f"{absolute_data_path_dir}/mood_categories.json")
     
     result_data = []
@@ -33,11 +72,10 @@ def mood_categories_json_tocsv():
                 "categoryParams": item['params']
             })
     
-    df = pd.DataFrame(result_data)
-    df.to_csv(f'{absolute_data_path_dir}/mood_categories.csv', index=False, encoding='utf-8')
+    write_parquet(result_data, MOOD_CATEGORIES_SCHEMA, "mood_categories")
 
-# mood_playlist.json -> csv
-def mood_playlist_json_tocsv():
+# mood_playlist.json -> parquet
+def mood_playlist_json_toparquet():
     data = load_from_json(f"{absolute_data_path_dir}/mood_playlist.json")
     
     result_data = []
@@ -50,108 +88,52 @@ def mood_playlist_json_tocsv():
                 "playlistId": item['playlistId'],
                 "playlistDescription": item['description']
             })
-    df = pd.DataFrame(result_data)
-    df.to_csv(f"{absolute_data_path_dir}/mood_playlist.csv", index=False, encoding='utf-8')
+    write_parquet(result_data, MOOD_PLAYLIST_SCHEMA, "mood_playlist")
 
 
-# playlist_songs.json -> csv
-def playlist_songs_json_tocsv():
-    data = load_from_json(f"{absolute_data_path_dir}/playlist_songs.json")
-    
+# playlist_songs.jsonl -> parquet
+def playlist_songs_json_toparquet():
     result_data = []
 
-    for playlistId, results in data.items():
+    for playlistId, results in iter_json_items("playlist_songs"):
         # for item in results:
         if results != 'get_playlist_error':
-            for track in results['tracks']:
-                result_data.append({
-                    "playlistId": playlistId,
-                    "playlistDescription": results['description'], # some nulls
-                    "playlistTitle": results['title'],
-                    "playlistYear": results['year'],
-                    "playlistDuration": results['duration'],
-                    "playlistTrackCount": results['trackCount'],
-                    "playlistRelated": results['related'], #check
-                    "songVideoId": track['videoId'], 
-                    "songTitleLong": track['title'], 
-                    "songArtists": track['artists'], 
-                    "songAlbum": track['album'], #check
-                    "songLikeStatus": track['likeStatus'], #check
-                    # "songInLibrary": track['inLibrary'], #all null
-                    "songIsAvailable": track['isAvailable'], #check
-                    "songIsExplicit": track['isExplicit'], #check
-                    "songVideoType": track['videoType'], #check
-                    # "songViews": track['views'], #all null
-                    "songDuration": track['duration'],
-                    "songDurationSec": track['duration_seconds']
-                })
-    df = pd.DataFrame(result_data)
-    df.to_csv(f"{absolute_data_path_dir}/playlist_songs.csv", index=False, encoding='utf-8')
-
-
-
-# songs_details.json -> csv
-def songs_details_json_tocsv():
-    data = load_from_json(f"{absolute_data_path_dir}/songs_details.json")
-    
+            result_data.extend(playlist_song_rows(playlistId, results))
+    write_parquet(result_data, PLAYLIST_SONGS_SCHEMA, "playlist_songs")
+
+
+
+# songs_details.jsonl -> parquet
+def songs_details_json_toparquet():
     result_data = []
 
-    for videoId, results in data.items():
+    for videoId, results in iter_json_items("songs_details"):
         # 有時會有results結果為get_song_error而非字典的情形
         if isinstance(results,dict): 
-            result_data.append({
-                "songVideoId": videoId,
-                "playabilityStatus": results['playabilityStatus']['status'],
-                "songTitleShort": results['videoDetails']['title'],
-                "songDurationSec2": results['videoDetails']['lengthSeconds'],
-                "channelId": results['videoDetails']['channelId'],
-                "viewCount": results['videoDetails']['viewCount'], 
-                "author": results['videoDetails']['author'],
-                # "musicVideoType": (results['videoDetails']['musicVideoType'] or "musicVideoType_none"),
-                "publishDate": results['microformat']['microformatDataRenderer']['publishDate'],
-                "songCategory": results['microformat']['microformatDataRenderer']['category'],
-                "uploadDate": results['microformat']['microformatDataRenderer']['uploadDate']
-            })
+            result_data.append(song_details_row(videoId, results))
         else:
             print(f"vidoeId: {videoId} - results: {results}")
             
-    df = pd.DataFrame(result_data)
-    df.to_csv(f"{absolute_data_path_dir}/songs_details.csv", index=False, encoding='utf-8')
-
-# watch_playlist_for_lyrics -> csv
-def watch_playlist_for_lyrics_tocsv():
-    data = load_from_json(f'{absolute_data_path_dir}/watch_playlist_for_lyrics.json')
-
-    # result_data = []
-    # for videoId, infos in data.items():
-    #     if isinstance(infos, dict):
-    #         result_data.append({
-    #             "songVideoId": videoId,
-    #             "lyricsId": infos['lyrics']
-    #         })
-    #     else:
-    #         print(f"videoId: {videoId} - infos: {infos}")
-    # df = pd.DataFrame(result_data)
-
-    df = pd.DataFrame(data.items(), columns=['songVideoId', 'lyricsId'])
-    df = df.dropna(subset=['lyricsId'])
-    
-    df.to_csv(f"{absolute_data_path_dir}/watch_playlist_for_lyrics.csv", index=False, encoding='utf-8')
+    write_parquet(result_data, SONGS_DETAILS_SCHEMA, "songs_details")
 
-# lyrics -> csv
-def lyrics_tocsv():
-    data = load_from_json(f'{absolute_data_path_dir}/lyrics.json')
-    result_data = []
-    for lyricsId, infos in data.items():
-        # if lyricsId != 'null':
-        if infos != 'get_lyrics_error':
-            result_data.append({
-                "lyricsId": lyricsId,
-                "lyrics": infos['lyrics'],
-                "lyricsSource": infos['source']
-            })
-    df = pd.DataFrame(result_data)
-    df.to_csv(f"{absolute_data_path_dir}/lyrics.csv", index=False, encoding='utf-8')
+# watch_playlist_for_lyrics.jsonl -> parquet
+def watch_playlist_for_lyrics_toparquet():
+    # the last journaled value of a videoId wins (a retried error is followed by its result)
+    data = dict(iter_json_items("watch_playlist_for_lyrics"))
+
+    result_data = [
+        {"songVideoId": videoId, "lyricsId": lyricsId}
+        for videoId, lyricsId in data.items()
+        if lyricsId is not None
+    ]
+    write_parquet(result_data, WATCH_PLAYLIST_FOR_LYRICS_SCHEMA, "watch_playlist_for_lyrics")
+
+# lyrics.csv (written by the crawl) -> parquet
+def lyrics_toparquet():
+    df = pd.read_csv(f"{absolute_data_path_dir}/lyrics.csv", encoding="utf-8", dtype=str, keep_default_na=False)
+    df = df.drop_duplicates(subset=['lyricsId'])
+    table = pa.Table.from_pandas(df, schema=LYRICS_SCHEMA, preserve_index=False)
+    pq.write_table(table, f"{absolute_data_path_dir}/lyrics.parquet")
 
 
 
@@ -164,14 +146,15 @@ def lyrics_tocsv():
 )
 def json_tocsv():
     """
-    convert json files to csv files respectively.
+    convert the crawl outputs (json, jsonl, lyrics.csv) to typed parquet files respectively.
+    each table has an explicit schema (schemas.py), so numbers and dates keep their types in merge_csv.
     """
-    mood_categories_json_tocsv()
-    mood_playlist_json_tocsv()
-    playlist_songs_json_tocsv()
-    songs_details_json_tocsv()
-    watch_playlist_for_lyrics_tocsv()
-    # lyrics_tocsv()
+    mood_categories_json_toparquet()
+    mood_playlist_json_toparquet()
+    playlist_songs_json_toparquet()
+    songs_details_json_toparquet()
+    watch_playlist_for_lyrics_toparquet()
+    lyrics_toparquet()
 
 
 
@@ -1,7 +1,17 @@
 import pandas as pd
+import duckdb
 from datetime import datetime
 from dagster import asset, AssetIn, RunRequest, AssetSelection, sensor
 import os
+from .records import (
+    CATEGORY_COLUMNS,
+    PLAYLIST_COLUMNS,
+    SONGS_COLUMNS,
+    DETAILS_COLUMNS,
+    WATCH_PLAYLIST_COLUMNS,
+    LYRICS_COLUMNS,
+    SONG_URL_PREFIX,
+)
 
 
 today = datetime.today().strftime('%Y%m%d') #yyyymmdd
@@ -14,45 +24,41 @@ script_dir = os.path.dirname(os.path.abspath(__file__))
 relative_data_path_dir = f"../data/{today}"
 absolute_data_path_dir = os.path.join(script_dir, relative_data_path_dir)
 
+# join engine: "duckdb" (out-of-core, bounded memory) or "pandas" (in memory)
+MERGE_ENGINE = os.getenv('YT_MERGE_ENGINE', 'duckdb')
+# duckdb spills to data/today/duckdb_tmp above this limit
+MERGE_MEMORY_LIMIT = os.getenv('YT_MERGE_MEMORY_LIMIT', '1GB')
 
-@asset(
-    group_name="step1_yt_raw_data",
-    deps=["json_tocsv"],
-)
-def merge_csv():
-    """
-    merge all csv and generate yt_category_songlist.csv
-    """
+def table_path(table_name):
+    return f"{absolute_data_path_dir}/{table_name}.parquet"
+
+# read data/today/<table>.parquet, only the given columns
+def read_table(table_name, columns):
+    return pd.read_parquet(table_path(table_name), columns=columns, dtype_backend="numpy_nullable")
 
 
-    df_category = pd.read_csv(f"{absolute_data_path_dir}/mood_categories.csv", encoding="utf-8")
-    df_playlist = pd.read_csv(f"{absolute_data_path_dir}/mood_playlist.csv", encoding="utf-8")
-    df_songs = pd.read_csv(f"{absolute_data_path_dir}/playlist_songs.csv", encoding="utf-8")
-    df_details = pd.read_csv(f"{absolute_data_path_dir}/songs_details.csv", encoding="utf-8")
+# pandas: in-memory merge ==============================================
+def merge_with_pandas(output_path):
+    # read only the columns kept in yt_category_songlist (column pruning), with their parquet types
+    df_category = read_table("mood_categories", CATEGORY_COLUMNS)
+    df_playlist = read_table("mood_playlist", ["categoryParams"] + PLAYLIST_COLUMNS)
+    df_songs = read_table("playlist_songs", ["playlistId"] + SONGS_COLUMNS)
+    df_details = read_table("songs_details", ["songVideoId"] + DETAILS_COLUMNS)
 
     # version1: keep the lyrics parts
-    df_watchplaylist = pd.read_csv(f"{absolute_data_path_dir}/watch_playlist_for_lyrics.csv", encoding="utf-8")
-    df_lyrics = pd.read_csv(f"{absolute_data_path_dir}/lyrics.csv", encoding = "utf-8")
+    df_watchplaylist = read_table("watch_playlist_for_lyrics", ["songVideoId"] + WATCH_PLAYLIST_COLUMNS)
+    df_lyrics = read_table("lyrics", ["lyricsId"] + LYRICS_COLUMNS)
 
 
     # merge: mood_categories, mood_playlist, playlist_songs, songs_details, watch_playlist_for_lyrics, lyrics
+    # (playlistDescription / playlistTitle of the other table, and the unused song columns, are not read at all)
     merge_temp = (pd.merge(df_category, df_playlist, on='categoryParams', how='inner')
-               .drop(columns=['playlistDescription'])
-               
                .merge(df_songs, on='playlistId', how='inner')
-               .drop(columns=['playlistRelated', 'songAlbum', 'songLikeStatus', 'songIsExplicit', 'songVideoType', 'songDuration'])
-               
-               .merge(df_details, on='songVideoId', how='left').drop(columns=['playlistTitle_y'])
-               .rename(columns={'playlistTitle_x': 'playlistTitle'})
+               .merge(df_details, on='songVideoId', how='left')
                )
     
-    # add songURL column
-    def generate_url(videoId):
-        if pd.notna(videoId): 
-            return f'https://music.youtube.com/watch?v={videoId}'
-        else:
-            return ''
-    merge_temp['songURL'] = merge_temp['songVideoId'].apply(generate_url)
+    # add songURL column (vectorized: null videoId -> '')
+    merge_temp['songURL'] = (SONG_URL_PREFIX + merge_temp['songVideoId']).fillna('')
 
     # add fetchDate column
     merge_temp['fetchDate'] = fetch_date
@@ -64,14 +70,70 @@ def merge_csv():
                    )
 
 
-    merge_final.to_csv(f"{absolute_data_path_dir}/yt_category_songlist.csv", encoding="utf-8", index=False)
+    merge_final.to_csv(output_path, encoding="utf-8", index=False)
 
     # version2: give up on lyrics parts:
     # merge_temp['lyricsId'] = ''
     # merge_temp['lyrics'] = ''
     # merge_temp['lyricsSource'] = ''
-    # merge_temp.to_csv(f"{absolute_data_path_dir}/yt_category_songlist.csv", encoding="utf-8", index=False)
+    # merge_temp.to_csv(output_path, encoding="utf-8", index=False)
+
+
+# duckdb: out-of-core merge ============================================
+# same joins as merge_with_pandas, streamed from the parquet files to the csv by duckdb,
+# spilling to disk instead of holding the category x playlist x song fan-out in memory
+def merge_with_duckdb(output_path):
+    temp_dir = f"{absolute_data_path_dir}/duckdb_tmp"
+
+    def select(alias, columns):
+        return [f'{alias}."{column}"' for column in columns]
+
+    select_columns = (select("c", CATEGORY_COLUMNS)
+                      + select("p", PLAYLIST_COLUMNS)
+                      + select("s", SONGS_COLUMNS)
+                      + select("d", DETAILS_COLUMNS)
+                      + [f"""COALESCE('{SONG_URL_PREFIX}' || s."songVideoId", '') AS "songURL\"""",
+                         f"""'{fetch_date}' AS "fetchDate\""""]
+                      + select("w", WATCH_PLAYLIST_COLUMNS)
+                      + select("l", LYRICS_COLUMNS))
+
+    query = f"""
+        SELECT {', '.join(select_columns)}
+        FROM read_parquet('{table_path("mood_categories")}') AS c
+        JOIN read_parquet('{table_path("mood_playlist")}') AS p ON c."categoryParams" = p."categoryParams"
+        JOIN read_parquet('{table_path("playlist_songs")}') AS s ON p."playlistId" = s."playlistId"
+        LEFT JOIN read_parquet('{table_path("songs_details")}') AS d ON s."songVideoId" = d."songVideoId"
+        LEFT JOIN read_parquet('{table_path("watch_playlist_for_lyrics")}') AS w ON s."songVideoId" = w."songVideoId"
+        LEFT JOIN read_parquet('{table_path("lyrics")}') AS l ON w."lyricsId" = l."lyricsId"
+    """
+
+    con = duckdb.connect()
+    try:
+        con.execute(f"SET memory_limit = '{MERGE_MEMORY_LIMIT}'")
+        con.execute(f"SET temp_directory = '{temp_dir}'")
+        con.execute("SET preserve_insertion_order = false") # lets duckdb stream the joins without buffering
+        con.execute(f"COPY ({query}) TO '{output_path}' (HEADER, DELIMITER ',')")
+    finally:
+        con.close()
+
+
+@asset(
+    group_name="step1_yt_raw_data",
+    deps=["json_tocsv"],
+)
+def merge_csv():
+    """
+    merge all parquet tables (written by json_tocsv) and generate yt_category_songlist.csv
+    YT_MERGE_ENGINE=duckdb (default) joins out-of-core with bounded memory (YT_MERGE_MEMORY_LIMIT),
+    YT_MERGE_ENGINE=pandas joins in memory.
+    """
+    output_path = f"{absolute_data_path_dir}/yt_category_songlist.csv"
+
+    if MERGE_ENGINE == 'pandas':
+        merge_with_pandas(output_path)
+    else:
+        merge_with_duckdb(output_path)
     
 
 
-# merge_csv()
\ No newline at end of file
+# merge_csv()
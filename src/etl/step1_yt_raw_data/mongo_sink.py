@@ -0,0 +1,31 @@
+import logging
+
+from pymongo.errors import BulkWriteError
+
+from .batch_writer import QueueWriter
+
+logger = logging.getLogger(__name__)
+
+
+class MongoSink(QueueWriter):
+    """
+    Streaming writer of records into one mongo collection:
+    a small pool of writer threads drains the queue with unordered insert_many batches of up to batch_size.
+    put never blocks; the crawl awaits drain() to keep at most max_in_flight records queued.
+    close() writes what is left, and checks that every record put was inserted.
+    """
+
+    def __init__(self, collection, writers=4, batch_size=1000, max_in_flight=10000, flush_interval=5.0):
+        super().__init__(f"mongo sink of {collection.name}", batch_size=batch_size, flush_interval=flush_interval,
+                         max_queue=max_in_flight, threads=writers)
+        self.collection = collection
+
+    def write_batch(self, batch):
+        try:
+            result = self.collection.insert_many(batch, ordered=False)
+            return len(result.inserted_ids)
+        except BulkWriteError as e:
+            # some records inserted: the count check of close() fails the sink
+            inserted = e.details.get('nInserted', 0)
+            logger.error(f"bulk insert into {self.collection.name}: {len(batch) - inserted} records failed")
+            return inserted
@@ -0,0 +1,102 @@
+# field projection of ytmusic responses ==================================
+# keep only the fields read by json_tocsv, in the same nested shape, so that
+# streamingData / thumbnails / formats etc. are dropped right after each api call.
+
+
+def _get_path(data, *path):
+    for key in path:
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+    return data
+
+
+def _project_refs(items, fields=("name", "id")):
+    # artists / album / related: keep the names and ids, drop thumbnails
+    if isinstance(items, list):
+        return [_project_refs(item, fields) for item in items]
+    if isinstance(items, dict):
+        return {field: items.get(field) for field in fields if field in items}
+    return items
+
+
+def project_mood_categories(response):
+    return {
+        category: [{"title": item.get("title"), "params": item.get("params")} for item in items]
+        for category, items in response.items()
+    }
+
+
+def project_mood_playlists(response):
+    return [
+        {
+            "title": item.get("title"),
+            "playlistId": item.get("playlistId"),
+            "description": item.get("description"),
+        }
+        for item in response
+    ]
+
+
+def project_playlist(response):
+    return {
+        "title": response.get("title"),
+        "description": response.get("description"),
+        "year": response.get("year"),
+        "duration": response.get("duration"),
+        "trackCount": response.get("trackCount"),
+        "related": _project_refs(response.get("related"), fields=("title", "playlistId", "browseId")),
+        "tracks": [
+            {
+                "videoId": track.get("videoId"),
+                "title": track.get("title"),
+                "artists": _project_refs(track.get("artists")),
+                "album": _project_refs(track.get("album")),
+                "likeStatus": track.get("likeStatus"),
+                "isAvailable": track.get("isAvailable"),
+                "isExplicit": track.get("isExplicit"),
+                "videoType": track.get("videoType"),
+                "duration": track.get("duration"),
+                "duration_seconds": track.get("duration_seconds"),
+            }
+            for track in response.get("tracks") or []
+        ],
+    }
+
+
+def project_song(response):
+    return {
+        "playabilityStatus": {
+            "status": _get_path(response, "playabilityStatus", "status"),
+        },
+        "videoDetails": {
+            field: _get_path(response, "videoDetails", field)
+            for field in ("title", "lengthSeconds", "channelId", "viewCount", "author")
+        },
+        "microformat": {
+            "microformatDataRenderer": {
+                field: _get_path(response, "microformat", "microformatDataRenderer", field)
+                for field in ("publishDate", "category", "uploadDate")
+            }
+        },
+    }
+
+
+def project_watch_playlist(response):
+    # only the lyrics browseId is used (for get_lyrics)
+    return {"lyrics": response.get("lyrics")}
+
+
+def project_lyrics(response):
+    return {"lyrics": response.get("lyrics"), "source": response.get("source")}
+
+
+# endpoint -> projection, used by CrawlEngine
+PROJECTIONS = {
+    "get_mood_categories": project_mood_categories,
+    "get_mood_playlists": project_mood_playlists,
+    "get_playlist": project_playlist,
+    "get_song": project_song,
+    "get_watch_playlist": project_watch_playlist,
+    "get_lyrics": project_lyrics,
+}
@@ -0,0 +1,160 @@
+from datetime import date
+
+from .schemas import to_int, to_date, to_json, to_str
+
+# yt_category_songlist columns =========================================
+# columns taken from each raw table; in this order they are the columns of yt_category_songlist
+CATEGORY_COLUMNS = ["category", "categoryTitle", "categoryParams"]
+PLAYLIST_COLUMNS = ["playlistTitle", "playlistId"]
+SONGS_COLUMNS = ["playlistDescription", "playlistYear", "playlistDuration", "playlistTrackCount", "songVideoId",
+                 "songTitleLong", "songArtists", "songIsAvailable", "songDurationSec"]
+DETAILS_COLUMNS = ["playabilityStatus", "songTitleShort", "songDurationSec2", "channelId", "viewCount", "author",
+                   "publishDate", "songCategory", "uploadDate"]
+WATCH_PLAYLIST_COLUMNS = ["lyricsId"]
+LYRICS_COLUMNS = ["lyrics", "lyricsSource"]
+
+SONG_URL_PREFIX = 'https://music.youtube.com/watch?v='
+
+
+# raw table rows =======================================================
+# playlist_songs rows of one get_playlist response
+def playlist_song_rows(playlistId, results):
+    rows = []
+    for track in results['tracks']:
+        rows.append({
+            "playlistId": playlistId,
+            "playlistDescription": results['description'], # some nulls
+            "playlistTitle": results['title'],
+            "playlistYear": to_str(results['year']),
+            "playlistDuration": to_str(results['duration']),
+            "playlistTrackCount": to_int(results['trackCount']),
+            "playlistRelated": to_json(results['related']), #check
+            "songVideoId": track['videoId'],
+            "songTitleLong": track['title'],
+            "songArtists": to_json(track['artists']),
+            "songAlbum": to_json(track['album']), #check
+            "songLikeStatus": to_str(track['likeStatus']), #check
+            # "songInLibrary": track['inLibrary'], #all null
+            "songIsAvailable": track['isAvailable'], #check
+            "songIsExplicit": track['isExplicit'], #check
+            "songVideoType": to_str(track['videoType']), #check
+            # "songViews": track['views'], #all null
+            "songDuration": to_str(track['duration']),
+            "songDurationSec": to_int(track['duration_seconds'])
+        })
+    return rows
+
+
+# songs_details row of one get_song response
+def song_details_row(videoId, results):
+    return {
+        "songVideoId": videoId,
+        "playabilityStatus": results['playabilityStatus']['status'],
+        "songTitleShort": results['videoDetails']['title'],
+        "songDurationSec2": to_int(results['videoDetails']['lengthSeconds']),
+        "channelId": results['videoDetails']['channelId'],
+        "viewCount": to_int(results['videoDetails']['viewCount']),
+        "author": results['videoDetails']['author'],
+        # "musicVideoType": (results['videoDetails']['musicVideoType'] or "musicVideoType_none"),
+        "publishDate": to_date(results['microformat']['microformatDataRenderer']['publishDate']),
+        "songCategory": results['microformat']['microformatDataRenderer']['category'],
+        "uploadDate": to_date(results['microformat']['microformatDataRenderer']['uploadDate'])
+    }
+
+
+# yt_category_songlist records built during the crawl =================
+class SongRecordBuilder:
+    """
+    Build yt_category_songlist records (same columns as merge_csv) while the crawl is running,
+    and pass each finished record to emit(record).
+    A record is emitted for every (category, playlist, video) as soon as both are known:
+        - the playlist (add_playlist) gives the category / playlist / track columns
+        - the video (set_song, set_lyrics_id, set_lyrics, then video_done) gives the details / lyrics columns
+    whichever of the two comes last.
+    """
+
+    def __init__(self, mood_categories, mood_playlists, fetch_date, emit):
+        self.fetch_date = fetch_date
+        self.emit = emit
+        self.emitted = 0
+
+        # categoryParams -> category columns
+        categories = {}
+        for category, items in mood_categories.items():
+            for item in items:
+                categories[item['params']] = {
+                    "category": category,
+                    "categoryTitle": item['title'],
+                    "categoryParams": item['params'],
+                }
+        # playlistId -> [category columns + playlist columns], a playlist can be in several categories
+        self.playlist_categories = {}
+        for params, playlists in mood_playlists.items():
+            if params not in categories:
+                continue
+            for playlist in playlists:
+                self.playlist_categories.setdefault(playlist['playlistId'], []).append({
+                    **categories[params],
+                    "playlistTitle": playlist['title'],
+                    "playlistId": playlist['playlistId'],
+                })
+
+        self.added_playlists = set()
+        self.pending_tracks = {} # videoId -> track rows waiting for the video
+        self.details = {}        # videoId -> details columns
+        self.video_lyrics_id = {}
+        self.lyrics = {}         # lyricsId -> lyrics columns
+        self.done_videos = set()
+
+    def add_playlist(self, playlist_id, playlist):
+        if playlist_id in self.added_playlists or not isinstance(playlist, dict):
+            return
+        self.added_playlists.add(playlist_id)
+
+        for row in playlist_song_rows(playlist_id, playlist):
+            video_id = row["songVideoId"]
+            if video_id in self.done_videos:
+                self._emit_track(row)
+            else:
+                self.pending_tracks.setdefault(video_id, []).append(row)
+
+    def set_song(self, video_id, song):
+        if isinstance(song, dict):
+            row = song_details_row(video_id, song)
+            self.details[video_id] = {column: row[column] for column in DETAILS_COLUMNS}
+
+    def set_lyrics_id(self, video_id, lyrics_id):
+        if lyrics_id is not None:
+            self.video_lyrics_id[video_id] = lyrics_id
+
+    def set_lyrics(self, lyrics_id, lyrics, lyrics_source):
+        self.lyrics[lyrics_id] = {"lyrics": lyrics, "lyricsSource": lyrics_source}
+
+    def video_done(self, video_id):
+        self.done_videos.add(video_id)
+        for row in self.pending_tracks.pop(video_id, []):
+            self._emit_track(row)
+
+    def _emit_track(self, track_row):
+        # inner join on category / playlist, left join on details / lyrics
+        video_id = track_row["songVideoId"]
+        details = self.details.get(video_id, {})
+        lyrics_id = self.video_lyrics_id.get(video_id)
+        lyrics = self.lyrics.get(lyrics_id, {})
+
+        for playlist_row in self.playlist_categories.get(track_row["playlistId"], []):
+            record = {column: playlist_row[column] for column in CATEGORY_COLUMNS + PLAYLIST_COLUMNS}
+            record.update({column: track_row[column] for column in SONGS_COLUMNS})
+            record.update({column: details.get(column) for column in DETAILS_COLUMNS})
+            record["songURL"] = f"{SONG_URL_PREFIX}{video_id}" if video_id else ''
+            record["fetchDate"] = self.fetch_date
+            record["lyricsId"] = lyrics_id
+            record.update({column: lyrics.get(column) for column in LYRICS_COLUMNS})
+
+            # mongo stores datetime, not date: keep dates as 'yyyy-mm-dd' text, as in the csv
+            for column, value in record.items():
+                if isinstance(value, date):
+                    record[column] = value.isoformat()
+
+            self.emit(record)
+            self.emitted += 1
@@ -0,0 +1,143 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from sqlite_store import SqliteStore
+
+logger = logging.getLogger(__name__)
+
+DAY = 24 * 60 * 60
+
+# default ttl (sec) of each cached endpoint. lyrics hardly ever change, view counts in get_song do:
+# get_song expires before the next weekly run (only re-runs of the same week reuse it).
+DEFAULT_TTLS = {
+    "get_song": int(os.getenv('YT_CACHE_TTL_GET_SONG', 3 * DAY)),
+    "get_watch_playlist": int(os.getenv('YT_CACHE_TTL_GET_WATCH_PLAYLIST', 30 * DAY)),
+    "get_lyrics": int(os.getenv('YT_CACHE_TTL_GET_LYRICS', 90 * DAY)),
+}
+
+
+# responses that are never cached: no lyrics (yet). lyrics are often published after the video,
+# so the next run asks again instead of missing them for a whole ttl.
+def is_negative(endpoint, value):
+    return endpoint in ("get_watch_playlist", "get_lyrics") and isinstance(value, dict) and not value.get("lyrics")
+
+
+class ResponseCache(SqliteStore):
+    """
+    ytmusic responses by (endpoint, id), as json:
+        - entries older than the endpoint's ttl are misses
+        - negative responses (is_negative) are not cached
+        - when the cache grows over max_bytes, the least recently used entries are evicted
+    Only endpoints listed in ttls are cached. Thread safe (one connection behind a lock):
+    CrawlEngine calls it on its cache thread, off the event loop.
+    """
+
+    def __init__(self, path, ttls=None, max_bytes=1024 * 1024 * 1024, commit_every=500):
+        super().__init__(path, ["""
+            CREATE TABLE IF NOT EXISTS responses (
+                endpoint TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (endpoint, key)
+            )
+        """, "CREATE INDEX IF NOT EXISTS idx_responses_accessed_at ON responses (accessed_at)"],
+            check_same_thread=False)
+        self.ttls = DEFAULT_TTLS if ttls is None else ttls
+        self.max_bytes = max_bytes
+        self.commit_every = commit_every
+        self.hits = {}
+        self.misses = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def is_cached(self, endpoint):
+        return endpoint in self.ttls
+
+    def get(self, endpoint, key):
+        """
+        Return (True, value) for a fresh entry, (False, None) otherwise.
+        """
+        with self._lock:
+            return self._get(endpoint, key)
+
+    def _get(self, endpoint, key):
+        now = time.time()
+        row = self.conn.execute(
+            "SELECT value, fetched_at FROM responses WHERE endpoint = ? AND key = ?",
+            (endpoint, str(key))).fetchone()
+
+        if row is None or now - row[1] > self.ttls[endpoint]:
+            self.misses[endpoint] = self.misses.get(endpoint, 0) + 1
+            return False, None
+        value = json.loads(row[0])
+        if is_negative(endpoint, value):
+            # cached before negative responses were skipped
+            self.misses[endpoint] = self.misses.get(endpoint, 0) + 1
+            return False, None
+
+        self.conn.execute(
+            "UPDATE responses SET accessed_at = ? WHERE endpoint = ? AND key = ?",
+            (now, endpoint, str(key)))
+        self._after_write()
+        self.hits[endpoint] = self.hits.get(endpoint, 0) + 1
+        return True, value
+
+    def put(self, endpoint, key, value):
+        if is_negative(endpoint, value):
+            return
+        now = time.time()
+        value_json = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (endpoint, key, value, size, fetched_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (endpoint, str(key), value_json, len(value_json), now, now))
+            self._after_write()
+
+    def _after_write(self):
+        self._pending += 1
+        if self._pending >= self.commit_every:
+            self.conn.commit()
+            self._pending = 0
+
+    def evict(self):
+        """
+        Drop expired entries, then least recently used entries until the cache fits in max_bytes.
+        """
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        now = time.time()
+        for endpoint, ttl in self.ttls.items():
+            self.conn.execute("DELETE FROM responses WHERE endpoint = ? AND fetched_at < ?", (endpoint, now - ttl))
+
+        total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total_bytes > self.max_bytes:
+            excess = total_bytes - self.max_bytes
+            # walk entries from least recently used, and delete until enough bytes are freed
+            self.conn.execute("""
+                DELETE FROM responses WHERE rowid IN (
+                    SELECT rowid FROM (
+                        SELECT rowid, SUM(size) OVER (ORDER BY accessed_at, rowid) AS freed
+                        FROM responses
+                    ) WHERE freed - size < ?
+                )
+            """, (excess,))
+            logger.info(f"response cache over {self.max_bytes} bytes, evicted ~{excess} bytes of LRU entries")
+        self.conn.commit()
+
+    def close(self):
+        self.evict()
+        super().close()
+
+    def stats(self):
+        endpoints = sorted(set(self.hits) | set(self.misses))
+        return {endpoint: {"hits": self.hits.get(endpoint, 0), "misses": self.misses.get(endpoint, 0)}
+                for endpoint in endpoints}
@@ -0,0 +1,93 @@
+import json
+from datetime import date
+
+import pyarrow as pa
+
+# explicit schema of each raw yt table (data/today/<table>.parquet) ======
+# written by json_tocsv, read by merge_csv
+
+MOOD_CATEGORIES_SCHEMA = pa.schema([
+    ("category", pa.string()),
+    ("categoryTitle", pa.string()),
+    ("categoryParams", pa.string()),
+])
+
+MOOD_PLAYLIST_SCHEMA = pa.schema([
+    ("categoryParams", pa.string()),
+    ("playlistTitle", pa.string()),
+    ("playlistId", pa.string()),
+    ("playlistDescription", pa.string()),
+])
+
+PLAYLIST_SONGS_SCHEMA = pa.schema([
+    ("playlistId", pa.string()),
+    ("playlistDescription", pa.string()),
+    ("playlistTitle", pa.string()),
+    ("playlistYear", pa.string()),
+    ("playlistDuration", pa.string()),
+    ("playlistTrackCount", pa.int64()),
+    ("playlistRelated", pa.string()), # json
+    ("songVideoId", pa.string()),
+    ("songTitleLong", pa.string()),
+    ("songArtists", pa.string()), # json
+    ("songAlbum", pa.string()), # json
+    ("songLikeStatus", pa.string()),
+    ("songIsAvailable", pa.bool_()),
+    ("songIsExplicit", pa.bool_()),
+    ("songVideoType", pa.string()),
+    ("songDuration", pa.string()),
+    ("songDurationSec", pa.int64()),
+])
+
+SONGS_DETAILS_SCHEMA = pa.schema([
+    ("songVideoId", pa.string()),
+    ("playabilityStatus", pa.string()),
+    ("songTitleShort", pa.string()),
+    ("songDurationSec2", pa.int64()),
+    ("channelId", pa.string()),
+    ("viewCount", pa.int64()),
+    ("author", pa.string()),
+    ("publishDate", pa.date32()),
+    ("songCategory", pa.string()),
+    ("uploadDate", pa.date32()),
+])
+
+WATCH_PLAYLIST_FOR_LYRICS_SCHEMA = pa.schema([
+    ("songVideoId", pa.string()),
+    ("lyricsId", pa.string()),
+])
+
+LYRICS_SCHEMA = pa.schema([
+    ("lyricsId", pa.string()),
+    ("lyrics", pa.string()),
+    ("lyricsSource", pa.string()),
+])
+
+
+# value converters (raw api values are mostly strings) ================
+def to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# "2024-10-21T05:00:10-07:00" or "2024-10-21" -> date(2024, 10, 21)
+def to_date(value):
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except (TypeError, ValueError):
+        return None
+
+
+# nested values (artists, album, related) are kept as json text
+def to_json(value):
+    if value is None:
+        return None
+    return json.dumps(value, ensure_ascii=False)
+
+
+def to_str(value):
+    if value is None:
+        return None
+    return str(value)
@@ -1,33 +1,66 @@
 # from pprint import pprint
 import logging
-from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import time
 import json
 import os
 from datetime import datetime
 from ytmusicapi import YTMusic
-from dagster import asset
+from dagster import asset, AssetExecutionContext, MetadataValue
 import csv
 import gc
+from .crawl_engine import CrawlEngine
+from .response_cache import ResponseCache
+from .projection import PROJECTIONS
+from .journal import StageJournal, CsvJournal, is_error_value
+from .records import SongRecordBuilder
+from .mongo_sink import MongoSink
+from .insert_to_mongo import get_mongo_client, MONGO_DB, YT_DIRECT_MONGO
+from snapshot_catalog import record_snapshot, WRITING, COMPLETE, FAILED
 
 ytmusic = YTMusic()
+
+# locations whose moods (step 1-2) are crawled, concurrently (YT_LOCATIONS=TW,JP,US; empty: ytmusicapi's default)
+# the moods of all locations are merged: a category / playlist found in several locations is kept once,
+# so its playlist (3.) and videos (4-6.) are fetched once
+YT_LOCATIONS = [location.strip() for location in os.getenv('YT_LOCATIONS', '').split(',') if location.strip()]
+ytmusic_locations = {location: YTMusic(location=location) for location in YT_LOCATIONS} or {"": ytmusic}
+
+# crawl engine: global bound of in-flight api calls, and the starting concurrency of each endpoint
+CRAWL_MAX_CONCURRENCY = int(os.getenv('YT_CRAWL_MAX_CONCURRENCY', 32))
+CRAWL_INITIAL_CONCURRENCY = int(os.getenv('YT_CRAWL_INITIAL_CONCURRENCY', 6))
+# crawl mode: "streaming" (stages feed each other through queues) or "staged" (one stage after another)
+CRAWL_MODE = os.getenv('YT_CRAWL_MODE', 'streaming')
+STREAM_QUEUE_SIZE = int(os.getenv('YT_STREAM_QUEUE_SIZE', 1000))
+# journals are written by one writer thread each, in batches of N rows (and at least every 10 sec)
+JOURNAL_FLUSH_EVERY = int(os.getenv('YT_JOURNAL_FLUSH_EVERY', 500))
+# direct mongo ingestion (YT_DIRECT_MONGO=1, streaming mode): writer threads, insert_many size, max queued records
+MONGO_WRITERS = int(os.getenv('YT_MONGO_WRITERS', 4))
+MONGO_BATCH_SIZE = int(os.getenv('YT_MONGO_BATCH_SIZE', 1000))
+MONGO_MAX_IN_FLIGHT = int(os.getenv('YT_MONGO_MAX_IN_FLIGHT', 10000))
+
 today = datetime.today().strftime('%Y%m%d')
 # today = '20241030_test_minimize'
+fetch_date = datetime.today().strftime('%Y-%m-%d')
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
 relative_data_path_dir = f"../data/{today}"
 absolute_data_path_dir = os.path.join(script_dir, relative_data_path_dir) # data/today
 
+# cross-week response cache of get_song / get_watch_playlist / get_lyrics (data/ytmusic_cache.sqlite)
+cache_path = os.path.join(script_dir, os.getenv('YT_CACHE_PATH', '../data/ytmusic_cache.sqlite'))
+CACHE_MAX_MB = int(os.getenv('YT_CACHE_MAX_MB', 1024))
+
 # general functions ====================================================
 # make folders
 def ensure_folder_exists(folder):
     if not os.path.exists(folder):
         os.makedirs(folder)
 
-# save to json
+# save to json (compact: no indent, these files are only read by json_tocsv)
 def save_to_json(data, filepath):
     with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=4)
+        json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
 
 # load from json
 def load_from_json(filepath):
@@ -38,58 +71,134 @@ def load_from_json(filepath):
 
 
 # logging ==============================================================
-ensure_folder_exists(absolute_data_path_dir)
+# log file under data/today, or ETL_LOG_DIR when set (e.g. a temp dir for the tests)
+log_dir = os.getenv('ETL_LOG_DIR') or absolute_data_path_dir
+ensure_folder_exists(log_dir)
 
 logging.basicConfig(level=logging.INFO, 
                     format='%(asctime)s - %(levelname)s - %(message)s', 
                     handlers=[
-                        logging.FileHandler(f'{absolute_data_path_dir}/ytmusicapi_tojson.log'),
+                        logging.FileHandler(f'{log_dir}/ytmusicapi_tojson.log'),
                         logging.StreamHandler()
                     ])
 logger = logging.getLogger(__name__)
 
 
 # api related functions ================================================
+# every api call goes through the shared CrawlEngine (adaptive concurrency per endpoint)
+# step 3-6 write append-only journals (.jsonl / lyrics.csv) under data/today:
+# a re-run of the asset skips ids that are already journaled and continues where it stopped.
+
+# journals of step 3-6
+def playlist_songs_journal():
+    return StageJournal(f'{absolute_data_path_dir}/playlist_songs.jsonl', flush_every=JOURNAL_FLUSH_EVERY)
+
+def songs_details_journal():
+    return StageJournal(f'{absolute_data_path_dir}/songs_details.jsonl', flush_every=JOURNAL_FLUSH_EVERY)
+
+def watch_playlist_journal():
+    return StageJournal(f'{absolute_data_path_dir}/watch_playlist_for_lyrics.jsonl', flush_every=JOURNAL_FLUSH_EVERY)
+
+def lyrics_journal():
+    return CsvJournal(f'{absolute_data_path_dir}/lyrics.csv', header=["lyricsId", "lyrics", "lyricsSource"],
+                      flush_every=JOURNAL_FLUSH_EVERY)
+
+# videoId of a get_playlist response (some videoId are null)
+def iter_playlist_video_ids(playlist):
+    if isinstance(playlist, dict):
+        for song in playlist.get("tracks", []):
+            video_id = song.get("videoId")
+            if video_id:
+                yield video_id
+
+# merge the get_mood_categories responses of all locations: {section: [category]}, a category (params) once
+def merge_mood_categories(categories_by_location):
+    mood_categories = {}
+    seen_params = set()
+    for categories in categories_by_location.values():
+        for section, items in categories.items():
+            merged = mood_categories.setdefault(section, [])
+            for item in items:
+                if item.get('params') not in seen_params:
+                    seen_params.add(item.get('params'))
+                    merged.append(item)
+    return mood_categories
+
+# merge the get_mood_playlists responses of all locations: {params: [playlist]}, a playlist once per params
+def merge_mood_playlists(playlists_by_location):
+    all_mood_playlists = {}
+    seen_playlists = set()
+    for mood_playlists in playlists_by_location.values():
+        for params, playlists in mood_playlists.items():
+            merged = all_mood_playlists.setdefault(params, [])
+            for playlist in playlists:
+                if (params, playlist.get('playlistId')) not in seen_playlists:
+                    seen_playlists.add((params, playlist.get('playlistId')))
+                    merged.append(playlist)
+    return all_mood_playlists
+
 # 1. get_mood_categories -> json
-def get_and_save_mood_categories():
+async def get_and_save_mood_categories(engine):
     logger.info('step 1. get_mood_categories: ')
     
     ensure_folder_exists(absolute_data_path_dir)
 
-    # api: get_mood_categories
-    mood_categories = ytmusic.get_mood_categories()
-    
+    # resume: already fetched by a previous attempt today
+    mood_categories = load_from_json(f'{absolute_data_path_dir}/mood_categories.json')
+    if mood_categories is not None:
+        logger.info('step 1 done (mood_categories.json exists).')
+        return mood_categories
+
+    # api: get_mood_categories, every location concurrently
+    responses = await asyncio.gather(*(engine.call("get_mood_categories", client=client)
+                                       for client in ytmusic_locations.values()))
+    categories_by_location = dict(zip(ytmusic_locations, responses))
+    mood_categories = merge_mood_categories(categories_by_location)
+
+    # per location: the params step 2 requests in each location
+    save_to_json(categories_by_location, f'{absolute_data_path_dir}/mood_categories_by_location.json')
     save_to_json(mood_categories, f'{absolute_data_path_dir}/mood_categories.json')
-    logger.info('step 1 done')
+    logger.info(f'step 1 done. locations: {list(ytmusic_locations)}')
     return mood_categories
 
 # 2. get_mood_playlists -> json
-def fetch_mood_playlists():
+async def fetch_mood_playlists(engine):
     logger.info('step 2. get_mood_playlists: ')
 
-    # load file to get "params"
-    mood_categories_data = load_from_json(f'{absolute_data_path_dir}/mood_categories.json')
-    
-    all_mood_playlists = {}
-
-    # api: get_mood_playlists(params)
-    for category, category_data in mood_categories_data.items():
-        for item in category_data:
-            params = item.get('params')
-            if params:
-                mood_playlists_data = ytmusic.get_mood_playlists(params)
-                all_mood_playlists[params] = mood_playlists_data
-            else:
-                print("params loaded fail.")
-                logger.info('params loaded fail.')
+    # resume: already fetched by a previous attempt today
+    all_mood_playlists = load_from_json(f'{absolute_data_path_dir}/mood_playlist.json')
+    if all_mood_playlists is not None:
+        logger.info('step 2 done (mood_playlist.json exists).')
+        return all_mood_playlists
+
+    # load file to get "params" of each location (mood_categories.json only: one default location)
+    categories_by_location = load_from_json(f'{absolute_data_path_dir}/mood_categories_by_location.json') \
+        or {"": load_from_json(f'{absolute_data_path_dir}/mood_categories.json')}
+
+    params_by_location = {}
+    for location, mood_categories_data in categories_by_location.items():
+        params_all = params_by_location.setdefault(location, [])
+        for category, category_data in mood_categories_data.items():
+            for item in category_data:
+                params = item.get('params')
+                if params:
+                    params_all.append(params)
+                else:
+                    logger.warning('params loaded fail.')
+
+    # api: get_mood_playlists(params), every location concurrently
+    responses = await asyncio.gather(*(engine.map("get_mood_playlists", params_all, error_value=[],
+                                                  client=ytmusic_locations.get(location, ytmusic))
+                                       for location, params_all in params_by_location.items()))
+    all_mood_playlists = merge_mood_playlists(dict(zip(params_by_location, responses)))
 
     
     save_to_json(all_mood_playlists, f'{absolute_data_path_dir}/mood_playlist.json')
     logger.info('step 2 done.')
     return all_mood_playlists
 
-# 3. get_playlist -> json
-def fetch_playlist_songs():
+# 3. get_playlist -> jsonl
+async def fetch_playlist_songs(engine):
     logger.info('step 3. get_playlist: ')
     # load file to get "playlistId"
     mood_playlist_data = load_from_json(f'{absolute_data_path_dir}/mood_playlist.json')
@@ -102,200 +211,340 @@ def fetch_playlist_songs():
             playlist_id_all.append(song.get('playlistId'))
     unique_playlist_id = list(set(playlist_id_all))
 
-    playlist_data = {}
     # api: get_playlist(playlistId)
-    def fetch_playlist_songs_child(playlist_id):
-        try:
-            playlist_data[playlist_id] = ytmusic.get_playlist(playlist_id)
-        except Exception as e:
-            logger.error(f"Error fetching playlist {playlist_id}: {e}")
-            playlist_data[playlist_id] = "get_playlist_error"
-
+    with playlist_songs_journal() as journal:
+        async def get_playlist(playlist_id):
+            try:
+                journal.append(playlist_id, await engine.call("get_playlist", playlist_id))
+            except Exception as e:
+                logger.error(f"Error fetching playlist {playlist_id}: {e}")
+                journal.append(playlist_id, "get_playlist_error")
+            await journal.drain()
 
-    with ThreadPoolExecutor(max_workers=6) as executor:
-        futures = []
-        for playlist_id in unique_playlist_id:
-            futures.append(executor.submit(fetch_playlist_songs_child, playlist_id))
-        
-        for future in futures:
-            future.result()
+        await asyncio.gather(*(get_playlist(playlist_id) for playlist_id in unique_playlist_id
+                               if not journal.is_done(playlist_id)))
 
-    
-    save_to_json(playlist_data, f'{absolute_data_path_dir}/playlist_songs.json')
     logger.info('step 3 done.')
-    return playlist_data
-
-# 4. ytmusic.get_song -> json 
-def fetch_songs_details():
-    logger.info('step 4. get_song: ')
-    # load file to get "videoId"
-    playlist_songs = load_from_json(f"{absolute_data_path_dir}/playlist_songs.json")
-    logger.info("playlist_songs.json loaded.")
-    # get videoId, unique
-    video_id_all = []
-    for params, songinfos in playlist_songs.items():
-        if songinfos != 'get_playlist_error':
-            for song in songinfos.get("tracks", []):
-                video_id = song.get("videoId")
-                if video_id: # some videoId are null
-                    video_id_all.append(video_id)
-    video_id_unique = list(set(video_id_all))
-
-
-    all_songs_data = {}
-    # api: get_song(videoId)
-    def fetch_details(video_id):
-        # if video_id not in all_songs_data:
-        try:
-            song_data = ytmusic.get_song(video_id)
-            all_songs_data[video_id] = song_data
-        except Exception as e:
-            logger.error(f"Error fetching song for video_id {video_id}: {e}")
-            all_songs_data[video_id] = "get_song_error"
-
-    with ThreadPoolExecutor(max_workers=6) as executor:
-        futures = []
-        # count = 0
-        for video_id in video_id_unique:
-            try: 
-                futures.append(executor.submit(fetch_details, video_id))
-            except Exception as e:
-                logger.error(f'fetch song details error: {video_id}, Exception msg: {e}')
-            # count += 1
-            # if count == 100:
-            #     break
-
-        for future in futures:
-            future.result()
 
+# 4-6. one task per videoId: get_song and get_watch_playlist (lyrics browseId) -> get_lyrics
+# the details, the lyricsId and the lyrics of a video are collected in one pass through the engine.
+class VideoFetcher:
+    """
+    Fetch everything needed for a videoId into the songs_details / watch_playlist_for_lyrics / lyrics journals.
+    A lyricsId shared by several videos is fetched once (one shared task, awaited by each of the videos).
+    With a SongRecordBuilder (records), the results are also passed to it, and the video is marked done
+    once its details and lyrics are known; sink is the writer of the records emitted (e.g. a MongoSink).
+    """
 
-    save_to_json(all_songs_data, f'{absolute_data_path_dir}/songs_details.json')
-    logger.info('step 4 done.')
-    gc.collect()
-    return all_songs_data
-
-# get lyrics: step 5,6
-# 5. get_watch_playlist -> json
-def fetch_watch_playlist():
-    logger.info('step 5. get_watch_playlist: ')
-    # load file to get "videoId"
-    playlist_songs = load_from_json(f"{absolute_data_path_dir}/playlist_songs.json")
-    # get videoId, unique
-    video_id_all = []
-    for params, songinfos in playlist_songs.items():
-        if songinfos != 'get_playlist_error':
-            for song in songinfos.get("tracks", []):
-                video_id = song.get("videoId")
-                if video_id: # some videoId are null
-                    video_id_all.append(video_id)
-    video_id_unique = list(set(video_id_all))
-
-
-    watch_playlist_data = {}
-    # api: get_watch_playlist(videoId)
-    def get_watch_playlist(video_id):
+    def __init__(self, engine, songs_journal, watch_journal, lyrics_journal_, records=None, sink=None):
+        self.engine = engine
+        self.songs_journal = songs_journal
+        self.watch_journal = watch_journal
+        self.lyrics_journal = lyrics_journal_
+        self.records = records
+        self.sink = sink
+        self.lyrics_tasks = {} # lyricsId -> task of its get_lyrics
+
+    def is_done(self, video_id):
+        return self.songs_journal.is_done(video_id) and self.watch_journal.is_done(video_id)
+
+    async def resume_lyrics(self):
+        # lyricsId journaled by a previous attempt, whose lyrics were not fetched yet
+        await asyncio.gather(*(self.fetch_lyrics(lyrics_id)
+                               for _, lyrics_id in self.watch_journal.items()
+                               if not is_error_value(lyrics_id)))
+
+    def replay_records(self):
+        """
+        Pass what previous attempts already journaled to the record builder (before resume_lyrics),
+        then mark the videos already done.
+        """
+        for lyrics_id, row in self.lyrics_journal.items():
+            self.records.set_lyrics(lyrics_id, row[1], row[2])
+        for video_id, song in self.songs_journal.items():
+            self.records.set_song(video_id, song)
+        for video_id, lyrics_id in self.watch_journal.items():
+            self.records.set_lyrics_id(video_id, lyrics_id) # the last journaled value wins, as in json_tocsv
+
+    def replay_done_videos(self):
+        # after resume_lyrics: the lyrics of every journaled lyricsId are known
+        for video_id in self.songs_journal.completed & self.watch_journal.completed:
+            self.records.video_done(video_id)
+
+    async def fetch_video(self, video_id):
+        await asyncio.gather(self.fetch_song(video_id), self.fetch_watch_playlist(video_id))
+        if self.records is not None:
+            self.records.video_done(video_id)
+        await self.drain()
+
+    async def drain(self):
+        # backpressure of the journal / record writers: the appends above never block the event loop
+        await self.songs_journal.drain()
+        await self.watch_journal.drain()
+        await self.lyrics_journal.drain()
+        if self.sink is not None:
+            await self.sink.drain()
+
+    # 4. get_song
+    async def fetch_song(self, video_id):
+        if self.songs_journal.is_done(video_id):
+            return
         try:
-            watch_playlist = ytmusic.get_watch_playlist(video_id)
-            watch_playlist_data[video_id] = watch_playlist["lyrics"]
+            song = await self.engine.call("get_song", video_id)
+            self.songs_journal.append(video_id, song)
+            if self.records is not None:
+                self.records.set_song(video_id, song)
         except Exception as e:
             logger.error(f"Error fetching song for video_id {video_id}: {e}")
-            watch_playlist_data[video_id] = "get_watch_playlist_error"
-    
-    with ThreadPoolExecutor(max_workers=6) as executor:
-        futures = []
-        # count = 0
-        for video_id in video_id_unique:
-            try:
-                futures.append(executor.submit(get_watch_playlist, video_id))
-            except Exception as e:
-                logger.error(f'get_watch_playlist error: {video_id}, Exception msg: {e}')
-            # count += 1
-            # if count == 100:
-            #     break
-        for future in futures:
-            future.result()        
-
-    save_to_json(watch_playlist_data, f'{absolute_data_path_dir}/watch_playlist_for_lyrics.json')
-    logger.info('step 5 done.')
-    gc.collect()
-    return watch_playlist_data
-
-
-# 6. get_lyrics -> csv
-def fetch_lyrics():
-    logger.info('step 6. get_lyrics: ')
-
-    # load file to get "lyricsId"
-    watch_playlist_data = load_from_json(f'{absolute_data_path_dir}/watch_playlist_for_lyrics.json')
-    logger.info("load watch_playlist_for_lyrics.json done")
-    lyrics_id_all = [value for value in watch_playlist_data.values() if value is not None]
-    lyrics_id_unique = list(set(lyrics_id_all))
-
-    # create the csv file to save into
-    csv_file_path = f'{absolute_data_path_dir}/lyrics.csv'
-    try:
-        with open(csv_file_path, mode="x", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow(["lyricsId", "lyrics", "lyricsSource"]) # write in csv headers
-    except FileExistsError:
-        pass
-
-
-    batch_size = 20
-    lyrics_batch = []
+            self.songs_journal.append(video_id, "get_song_error")
 
-    # api: get_lyrics(lyricsId)
-    def get_lyrics(lyrics_id):
+    # 5. get_watch_playlist -> 6. get_lyrics
+    async def fetch_watch_playlist(self, video_id):
+        if self.watch_journal.is_done(video_id):
+            return
+        try:
+            watch_playlist = await self.engine.call("get_watch_playlist", video_id)
+        except Exception as e:
+            logger.error(f"Error fetching watch playlist for video_id {video_id}: {e}")
+            self.watch_journal.append(video_id, "get_watch_playlist_error")
+            if self.records is not None:
+                self.records.set_lyrics_id(video_id, "get_watch_playlist_error")
+            return
+        lyrics_id = watch_playlist.get("lyrics")
+        self.watch_journal.append(video_id, lyrics_id)
+        if self.records is not None:
+            self.records.set_lyrics_id(video_id, lyrics_id)
+        await self.fetch_lyrics(lyrics_id)
+
+    # 6. get_lyrics -> csv
+    async def fetch_lyrics(self, lyrics_id):
+        if not lyrics_id:
+            return
+        if lyrics_id not in self.lyrics_tasks:
+            if self.lyrics_journal.is_done(lyrics_id):
+                return
+            self.lyrics_tasks[lyrics_id] = asyncio.ensure_future(self._get_lyrics(lyrics_id))
+        # shield: a cancelled video must not cancel the fetch other videos are waiting for
+        await asyncio.shield(self.lyrics_tasks[lyrics_id])
+
+    async def _get_lyrics(self, lyrics_id):
         try:
-            lyrics_info = ytmusic.get_lyrics(lyrics_id)
-            lyrics_data = [
+            lyrics_info = await self.engine.call("get_lyrics", lyrics_id)
+            row = [
                 lyrics_id,
                 lyrics_info.get("lyrics", ""), # if get("lyrics") failed -> ""
                 lyrics_info.get("source", "") # if get("source") failed -> ""
             ]
-            lyrics_batch.append(lyrics_data)
-
-            # when batch is full, append to csv, and clear lyrics_batch
-            if len(lyrics_batch) >= batch_size:
-                with open(csv_file_path, mode="a", newline="") as f:
-                    writer = csv.writer(f)
-                    writer.writerows(lyrics_batch)
-                logger.info("batch writing into csv")
-                lyrics_batch.clear()  # 清空批次資料
-
+            self.lyrics_journal.append(lyrics_id, row)
+            if self.records is not None:
+                self.records.set_lyrics(*row)
         except Exception as e:
             logger.error(f"Error fetching lyrics for lyrics_id {lyrics_id}: {e}")
-            # lyrics_data[lyrics_id] = "get_lyrics_error"
-        
-    
 
-    with ThreadPoolExecutor(max_workers=6) as executor:
-        futures = []
-        # count = 0
-        for lyrics_id in lyrics_id_unique:
-            try:
-                futures.append(executor.submit(get_lyrics, lyrics_id))
-            except Exception as e:
-                logger.error(f'lyricId: {lyrics_id} - Exception msg: {e}')
-            # count += 1
-            # if count == 100:
-            #     break
-        for future in futures:
-            future.result()
-
-    # check if there is batch left (when len(lyrics_batch) < batch_size):
-    if lyrics_batch:
-        with open(csv_file_path, mode="a", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerows(lyrics_batch)
-        lyrics_batch.clear()
-
-
-    logger.info('step 6 done.')
+
+# staged mode 4-6. fused per-video fetch of every videoId in the step 3 journal
+async def fetch_videos(engine):
+    logger.info('step 4-6. get_song, get_watch_playlist -> get_lyrics: ')
+    # get videoId from step 3 journal, unique
+    video_id_unique = {video_id
+                       for _, playlist in playlist_songs_journal().items()
+                       for video_id in iter_playlist_video_ids(playlist)}
+
+    with songs_details_journal() as songs_journal, \
+         watch_playlist_journal() as watch_journal, \
+         lyrics_journal() as lyrics_journal_:
+        fetcher = VideoFetcher(engine, songs_journal, watch_journal, lyrics_journal_)
+        await fetcher.resume_lyrics()
+        await asyncio.gather(*(fetcher.fetch_video(video_id) for video_id in video_id_unique
+                               if not fetcher.is_done(video_id)))
+
+    logger.info(f'step 4-6 done. videos: {len(video_id_unique)}, lyrics fetched: {len(fetcher.lyrics_tasks)}')
     gc.collect()
-    return None
 
 
+# staged mode: run all stages one after another on one event loop, sharing one CrawlEngine
+async def run_staged_crawl(engine):
+    stages = [
+        get_and_save_mood_categories, # 1.
+        fetch_mood_playlists,         # 2.
+        fetch_playlist_songs,         # 3.
+        fetch_videos,                 # 4-6.
+    ]
+
+    for stage in stages:
+        start_time = time.time()
+        await stage(engine)
+        end_time = time.time()
+        time_msg = f"time spent for '{stage.__name__}': {(end_time - start_time):.2f} sec"
+        logger.info(time_msg)
+
+
+# streaming mode: step 3-6 as one pipeline
+# a videoId found by get_playlist is queued right away for its fused per-video fetch (4-6).
+# results are appended to the journals as they arrive instead of being kept in memory.
+# with a SongRecordBuilder (records), every (playlist, video) record is also built as soon as both are fetched,
+# and emitted to sink.
+async def stream_playlist_songs(engine, playlist_ids, records=None, sink=None):
+    logger.info('step 3-6. streaming get_playlist -> get_song, get_watch_playlist -> get_lyrics: ')
+
+    playlist_queue = asyncio.Queue()
+    video_queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+    seen_video_ids = set()
+
+    with playlist_songs_journal() as playlist_journal, \
+         songs_details_journal() as songs_journal, \
+         watch_playlist_journal() as watch_journal, \
+         lyrics_journal() as lyrics_journal_:
+
+        fetcher = VideoFetcher(engine, songs_journal, watch_journal, lyrics_journal_, records=records, sink=sink)
+
+        async def queue_video(video_id):
+            if video_id not in seen_video_ids:
+                seen_video_ids.add(video_id)
+                if not fetcher.is_done(video_id):
+                    await video_queue.put(video_id)
+
+        # 3. get_playlist -> queue videoId
+        async def playlist_worker():
+            while not playlist_queue.empty():
+                playlist_id = playlist_queue.get_nowait()
+                try:
+                    playlist = await engine.call("get_playlist", playlist_id)
+                except Exception as e:
+                    logger.error(f"Error fetching playlist {playlist_id}: {e}")
+                    playlist_journal.append(playlist_id, "get_playlist_error")
+                    await playlist_journal.drain()
+                    continue
+
+                playlist_journal.append(playlist_id, playlist)
+                await playlist_journal.drain()
+                if records is not None:
+                    records.add_playlist(playlist_id, playlist)
+                    await fetcher.drain()
+                for video_id in iter_playlist_video_ids(playlist):
+                    await queue_video(video_id)
+
+        # 4-6. per-video fetch
+        # api errors are journaled by fetch_video; what escapes it is a failed journal / mongo sink write
+        async def video_worker():
+            while True:
+                video_id = await video_queue.get()
+                try:
+                    await fetcher.fetch_video(video_id)
+                finally:
+                    video_queue.task_done()
+
+        async def produce():
+            # resume: re-feed the pipeline from what previous attempts already journaled
+            if records is not None:
+                fetcher.replay_records()
+            await fetcher.resume_lyrics()
+            if records is not None:
+                fetcher.replay_done_videos()
+                await fetcher.drain()
+            for playlist_id, playlist in playlist_journal.items():
+                if records is not None:
+                    records.add_playlist(playlist_id, playlist)
+                    await fetcher.drain()
+                for video_id in iter_playlist_video_ids(playlist):
+                    await queue_video(video_id)
+
+            for playlist_id in playlist_ids:
+                if not playlist_journal.is_done(playlist_id):
+                    playlist_queue.put_nowait(playlist_id)
+            await asyncio.gather(*(playlist_worker() for _ in range(engine.max_concurrency)))
+            await video_queue.join()
+
+        # enough workers to keep every endpoint at its max concurrency
+        consumers = [asyncio.create_task(video_worker()) for _ in range(engine.max_concurrency)]
+        producer = asyncio.create_task(produce())
+        try:
+            # a consumer only ends by an error: stop the producers (they would wait on the queue forever)
+            # and fail the run, instead of waiting for the videos no one fetches anymore
+            await asyncio.wait([producer, *consumers], return_when=asyncio.FIRST_COMPLETED)
+            for task in consumers:
+                if task.done():
+                    logger.error(f"step 3-6 stopped, a video worker failed: {task.exception()}")
+                    raise task.exception()
+            producer.result()
+        finally:
+            for task in [producer, *consumers]:
+                task.cancel()
+            await asyncio.gather(producer, *consumers, return_exceptions=True)
+
+    logger.info(f'step 3-6 done. videos: {len(seen_video_ids)}, lyrics fetched: {len(fetcher.lyrics_tasks)}')
+    gc.collect()
+
+
+# direct ingestion: the records of stream_playlist_songs go straight into yt_category_songlist_{today},
+# through a MongoSink (unordered insert_many from a few writer threads, overlapping with the crawl).
+# the collection is rebuilt from the journals on a retry, so it never holds a record twice.
+async def stream_to_mongo(engine, mood_categories, mood_playlist_data, playlist_ids):
+    client = get_mongo_client()
+    try:
+        db = client[MONGO_DB]
+        collection = db[f"yt_category_songlist_{today}"]
+        # snapshot catalog: the collection is filled in place, readers wait for "complete"
+        record_snapshot(db, "yt", collection.name, today, WRITING)
+        try:
+            collection.drop()
+            with MongoSink(collection,
+                           writers=MONGO_WRITERS,
+                           batch_size=MONGO_BATCH_SIZE,
+                           max_in_flight=MONGO_MAX_IN_FLIGHT) as sink:
+                records = SongRecordBuilder(mood_categories, mood_playlist_data, fetch_date, emit=sink.put)
+                await stream_playlist_songs(engine, playlist_ids, records=records, sink=sink)
+        except BaseException:
+            record_snapshot(db, "yt", collection.name, today, FAILED)
+            raise
+        record_snapshot(db, "yt", collection.name, today, COMPLETE, rows=records.emitted)
+        logger.info(f"Mongo insert done: {collection.name}, {records.emitted} records")
+        return records.emitted
+    finally:
+        client.close()
+
+
+async def run_streaming_crawl(engine):
+    start_time = time.time()
+    mood_categories = await get_and_save_mood_categories(engine) # 1.
+    mood_playlist_data = await fetch_mood_playlists(engine) # 2.
+
+    # get all playlist id (unique)
+    unique_playlist_id = list({song.get('playlistId')
+                               for playlist in mood_playlist_data.values()
+                               for song in playlist})
+    records_inserted = None
+    if YT_DIRECT_MONGO:
+        records_inserted = await stream_to_mongo(engine, mood_categories, mood_playlist_data, unique_playlist_id) # 3-6.
+    else:
+        await stream_playlist_songs(engine, unique_playlist_id) # 3-6.
+
+    time_msg = f"time spent for 'run_streaming_crawl': {(time.time() - start_time):.2f} sec"
+    logger.info(time_msg)
+    return records_inserted
+
+
+async def run_crawl():
+    cache = ResponseCache(cache_path, max_bytes=CACHE_MAX_MB * 1024 * 1024)
+    try:
+        async with CrawlEngine(ytmusic,
+                               max_concurrency=CRAWL_MAX_CONCURRENCY,
+                               initial_concurrency=CRAWL_INITIAL_CONCURRENCY,
+                               cache=cache,
+                               projections=PROJECTIONS) as engine:
+            records_inserted = None
+            if CRAWL_MODE == 'staged':
+                if YT_DIRECT_MONGO:
+                    logger.warning("YT_DIRECT_MONGO needs YT_CRAWL_MODE=streaming: not inserted, "
+                                   "run json_tocsv / merge_csv / insert_to_mongo with YT_DIRECT_MONGO=0")
+                await run_staged_crawl(engine)
+            else:
+                records_inserted = await run_streaming_crawl(engine)
+
+            logger.info(f"crawl engine stats: {engine.stats()}")
+            return engine.stats(), records_inserted
+    finally:
+        cache.close()
 
 
 
@@ -304,77 +553,48 @@ def fetch_lyrics():
 @asset(
     group_name="step1_yt_raw_data",
 )
-def ytmusicapi_tojson():
+def ytmusicapi_tojson(context: AssetExecutionContext):
     """
     Run all the ytmusic api request functions and save the data to json files.
     Api functions contain: 
-        1. get_and_save_mood_categories
+        1. get_and_save_mood_categories (2. too: for every location of YT_LOCATIONS, merged)
         2. fetch_mood_playlists
         3. fetch_playlist_songs
-        4. fetch_songs_details
-        5. fetch_watch_playlist
-        6. fetch_lyrics
+        4-6. fetch_videos: one fused task per videoId (get_song, get_watch_playlist -> get_lyrics)
+    All api calls share one CrawlEngine (asyncio), which adapts the concurrency of each endpoint (AIMD).
+    YT_CRAWL_MODE=streaming (default) runs 3-6 as one queue pipeline;
+    YT_CRAWL_MODE=staged runs the steps one after another.
+    Step 3-6 append to per-stage journals (.jsonl, lyrics.csv) under data/today, so a retry of this asset
+    skips the ids that are already done.
+    Responses are projected to the fields json_tocsv needs (projection.py) right after each call.
+    get_song / get_watch_playlist / get_lyrics are served from the cross-week ResponseCache when possible;
+    its hit/miss counts are added to the asset metadata.
+    YT_DIRECT_MONGO=1 (streaming mode) also inserts the yt_category_songlist records into mongo during the crawl;
+    json_tocsv / merge_csv then only produce debug files, and insert_to_mongo skips.
     """
     main_start_time = time.time()  # 開始時間
-    print("main: time start...")
-    logging.info("main: time start...")
+    logger.info("main: time start...")
+    context.log.info("main: time start...")
 
     #  run api functions ================
-    1.
-    start_time = time.time()
-    get_and_save_mood_categories()
-    end_time = time.time()
-    time_msg = f"time spent for 'get_and_save_mood_categories': {(end_time - start_time):.2f} sec"
-    print(time_msg)
-    logging.info(time_msg)
-
-    # 2.
-    start_time = time.time()
-    fetch_mood_playlists()
-    end_time = time.time()
-    time_msg = f"time spent for 'fetch_mood_playlists': {(end_time - start_time):.2f} sec"
-    print(time_msg)
-    logging.info(time_msg)
-    
-    # 3.
-    start_time = time.time()
-    fetch_playlist_songs()
-    end_time = time.time()
-    time_msg = f"time spent for 'fetch_playlist_songs': {(end_time - start_time):.2f} sec"
-    print(time_msg)
-    logging.info(time_msg)
-    
-    # 4.
-    start_time = time.time()
-    fetch_songs_details()
-    end_time = time.time()
-    time_msg = f"time spent for 'fetch_songs_details': {(end_time - start_time):.2f} sec"
-    print(time_msg)
-    logging.info(time_msg)
-
-    # 5.
-    start_time = time.time()
-    fetch_watch_playlist()
-    end_time = time.time()
-    time_msg = f"time spent for 'fetch_watch_playlist': {(end_time - start_time):.2f} sec"
-    print(time_msg)
-    logging.info(time_msg)
-
-    # 6.
-    start_time = time.time()
-    fetch_lyrics()
-    end_time = time.time()
-    time_msg = f"time spent for 'fetch_lyrics': {(end_time - start_time):.2f} sec"
-    print(time_msg)
-    logging.info(time_msg)
+    crawl_stats, records_inserted = asyncio.run(run_crawl())
     # #  ==============================
 
 
     main_end_time = time.time()  # 結束時間
     main_total_time = main_end_time - main_start_time 
     time_msg = f"All done. Time spent: {main_total_time:.2f} sec"
-    print(time_msg)
-    logging.info(time_msg)
+    logger.info(time_msg)
+    context.log.info(time_msg)
+
+    metadata = {"crawl_stats": MetadataValue.json(crawl_stats)}
+    for endpoint, endpoint_stats in crawl_stats.items():
+        if "hits" in endpoint_stats:
+            metadata[f"cache_hits_{endpoint}"] = endpoint_stats["hits"]
+            metadata[f"cache_misses_{endpoint}"] = endpoint_stats["misses"]
+    if records_inserted is not None:
+        metadata["mongo_records_inserted"] = records_inserted
+    context.add_output_metadata(metadata)
 
     return today
 
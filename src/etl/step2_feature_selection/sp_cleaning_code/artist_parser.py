@@ -0,0 +1,49 @@
+import ast
+import re
+
+import pandas as pd
+
+# a "name" entry of a stringified artist list, python repr or json:
+#     [{'name': 'Jay Chou'}, {'name': "Guns N' Roses"}]  /  [{"name": "Jay Chou"}]
+# group 1: single-quoted name, group 2: double-quoted name (backslash escapes kept as written)
+# (quoted strings in the "unrolled loop" form: no alternation per character)
+NAME_PATTERN = re.compile(
+    r"""['"]name['"]\s*:\s*(?:'([^'\\]*(?:\\.[^'\\]*)*)'|"([^"\\]*(?:\\.[^"\\]*)*)")"""
+)
+
+
+def _unescape(name, quote):
+    # only names with a backslash escape need decoding; literal_eval of a string literal never runs code
+    if "\\" not in name:
+        return name
+    try:
+        return ast.literal_eval(f"{quote}{name}{quote}")
+    except (SyntaxError, ValueError):
+        return name
+
+
+def _names(value):
+    if isinstance(value, str):
+        # stringified list: every "name" entry, in one regex scan
+        return [_unescape(single, "'") if single or not double else _unescape(double, '"')
+                for single, double in NAME_PATTERN.findall(value)]
+    if isinstance(value, list):
+        # decoded list
+        return [artist.get("name") for artist in value
+                if isinstance(artist, dict) and artist.get("name") is not None]
+    return []
+
+
+def parse_artist_names(artist):
+    """
+    Parse an artist column into the list of all artist names of each row, without evaluating the text.
+
+    Parameters:
+    artist (pd.Series): Artist lists, either already decoded (list of {"name": ...}, from mongo)
+                        or stringified (python repr or json text); empty / missing values give [].
+
+    Returns:
+    pd.Series: List of artist names per row, in the order of the artist list.
+    """
+    # one pass over the column values (no per-row pandas overhead, no intermediate frames)
+    return pd.Series([_names(value) for value in artist.tolist()], index=artist.index, dtype=object)
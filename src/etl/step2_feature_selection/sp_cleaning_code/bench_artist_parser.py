@@ -0,0 +1,59 @@
+"""
+Benchmark: parse_artist_names (artist_parser) vs the former apply(extract_artist_name) with eval().
+
+usage (from src/etl):
+    python -m step2_feature_selection.sp_cleaning_code.bench_artist_parser [rows]
+"""
+import random
+import sys
+import time
+
+import pandas as pd
+
+from .artist_parser import parse_artist_names
+
+ARTISTS = ["周杰倫", "Jay Chou", "YOASOBI", "米津玄師", "Guns N' Roses", "Taylor Swift", 'The "Band"', "五月天",
+           "Beyoncé", "Ed Sheeran", "AKB48", "Back\\slash"]
+
+
+# former sp_clean parser: first artist name only, eval() of every row
+def extract_artist_name(artist_list):
+    try:
+        artist_data = eval(artist_list) if isinstance(artist_list, str) else artist_list
+        if isinstance(artist_data, list) and len(artist_data) > 0 and isinstance(artist_data[0], dict):
+            return artist_data[0].get("name", None)
+        return None
+    except (SyntaxError, ValueError):
+        return None
+
+
+def make_column(rows, seed=0):
+    # stringified artist lists as written by the former csv pipeline (python repr of the spotify artists)
+    rng = random.Random(seed)
+    return pd.Series([repr([{"name": name} for name in rng.sample(ARTISTS, rng.randint(1, 3))])
+                      for _ in range(rows)])
+
+
+def timed(func, column):
+    start = time.perf_counter()
+    result = func(column)
+    return result, time.perf_counter() - start
+
+
+def main(rows=100000):
+    column = make_column(rows)
+
+    first_names, eval_sec = timed(lambda c: c.apply(extract_artist_name), column)
+    all_names, parser_sec = timed(parse_artist_names, column)
+
+    # same first artist as before, plus all the others
+    assert all_names.str[0].tolist() == first_names.tolist(), "first artist differs from eval()"
+    assert all_names.map(len).sum() > rows
+
+    print(f"rows: {rows}")
+    print(f"apply(extract_artist_name) (eval, first name): {eval_sec:.3f} sec")
+    print(f"parse_artist_names (regex, all names):        {parser_sec:.3f} sec ({eval_sec / parser_sec:.1f}x)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
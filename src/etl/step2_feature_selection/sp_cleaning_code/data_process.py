@@ -1,5 +1,7 @@
 import pandas as pd
 
+from .artist_parser import parse_artist_names
+
 def clean_data(data):
     # 將空字串轉為 NaN
     data.replace("", pd.NA, inplace=True)
@@ -25,22 +27,10 @@ def clean_data(data):
 
 
 
-def extract_artist_name(artist_list):
-    try:
-        # 如果是字串，轉換為列表
-        artist_data = eval(artist_list) if isinstance(artist_list, str) else artist_list
-        if (
-            isinstance(artist_data, list)
-            and len(artist_data) > 0
-            and isinstance(artist_data[0], dict)
-        ):
-            return artist_data[0].get(
-                "name", None
-            )  # 從字典中提取 'name'，如果是 None 則保留 None
-        else:
-            return None  # 保留 None 形式
-    except (SyntaxError, ValueError):
-        return None  # 處理無效格式
+def extract_artist_names(data):
+    # artist欄位 -> 所有歌手名稱的list (artist_parser: 整欄一次解析，不執行字串內容)
+    data["artist"] = parse_artist_names(data["artist"])
+    return data
 
 
 
@@ -53,7 +43,7 @@ def group_data(data):
         df_grouped = data.groupby(["id"], as_index=False).agg(
             {
                 "track": "first",
-                "artist": lambda x: list(set(x)),
+                "artist": lambda x: list(dict.fromkeys(name for names in x for name in names)), # 所有列的歌手，依出現順序不重複
                 "category": lambda x: list(set(x)),
                 "playlistName": lambda x: list(set(x)),
                 "trackURL": "first",
@@ -81,3 +71,30 @@ def group_data(data):
         )
     except Exception as e:
         print(f"An unexpected error occurred while grouping the data: {e}")
+
+
+def merge_grouped_data(grouped_chunks):
+    # 合併各 chunk 的 group_data 結果 (每個 id 一列，同 group_data 全部資料的結果)
+    try:
+        union = lambda x: list(set(item for items in x for item in items))
+        first = {column: "first" for column in ["track", "trackURL", "date_added", "duration_ms", "time_signature",
+                                                "danceability", "energy", "key", "loudness", "mode", "speechiness",
+                                                "acousticness", "instrumentalness", "liveness", "valence", "tempo",
+                                                "fetchDate"]}
+        df_merged = (
+            pd.concat(grouped_chunks, ignore_index=True)
+            .groupby(["id"], as_index=False)
+            .agg(
+                {
+                    **first,
+                    "artist": lambda x: list(dict.fromkeys(name for names in x for name in names)), # 依 chunk 順序不重複
+                    "category": union,
+                    "playlistName": union,
+                }
+            )
+        )
+        return df_merged[grouped_chunks[0].columns]
+    except ValueError as e:
+        print(f"Error: No data to merge: {e}")
+    except Exception as e:
+        print(f"An unexpected error occurred while merging the grouped data: {e}")
@@ -1,7 +1,12 @@
 from pymongo import MongoClient, errors
 import configparser
+import itertools
 import pandas as pd
 import re
+from snapshot_catalog import latest_snapshot
+
+# documents per DataFrame chunk (and per cursor batch)
+CHUNK_SIZE = 50000
 
 
 def connect_to_mongodb(path):
@@ -29,24 +34,55 @@ def connect_to_mongodb(path):
 
 def get_latest_spotify_collection(client, db_name, prefix="spotify_data_"):
     db = client[db_name]
-    collections = [col for col in db.list_collection_names() if col.startswith(prefix)]
-    latest_collection = max(collections, key=lambda x: int(re.findall(r'\d+', x)[0]))
+    # snapshot catalog: latest complete snapshot, one indexed read
+    snapshot = latest_snapshot(db, "spotify")
+    if snapshot is not None:
+        return snapshot["_id"]
+    # no catalog entry (snapshots written before the catalog): latest collection by the date in its name
+    # (only prefix + yyyymmdd: not the staging collection of an import in progress, spotify_data_{date}_staging)
+    collections = [col for col in db.list_collection_names() if re.fullmatch(rf"{prefix}\d{{8}}", col)]
+    latest_collection = max(collections, key=lambda x: int(x[len(prefix):]))
     return latest_collection
 
 
 
 
 
-def read_mongodb_data(client, db_name, collection_name, query=None):
+def read_mongodb_data(client, db_name, collection_name, query=None, columns=None, batch_size=CHUNK_SIZE):
     db = client[db_name]
     collection = db[collection_name]
     if query is None:
         query = {}
-    cursor = collection.find(query)
+    # projection: only the columns used by the transforms are sent by mongo
+    projection = None if columns is None else {"_id": 0, **{column: 1 for column in columns}}
+    cursor = collection.find(query, projection, batch_size=batch_size)
     return cursor
 
 
-def read_mongo_data(mongopath):
+def cursor_to_frames(cursor, columns, chunk_size=CHUNK_SIZE):
+    """
+    Read the cursor chunk by chunk; each chunk is built by pandas from the documents (columns filled in C,
+    no python list per column).
+
+    Parameters:
+    cursor: pymongo cursor (projected on columns).
+    columns (list of str): Columns of the DataFrames; a field missing in a document is None.
+    chunk_size (int): Documents per DataFrame.
+
+    Returns:
+    generator of pd.DataFrame: One DataFrame per chunk.
+    """
+    while True:
+        documents = list(itertools.islice(cursor, chunk_size))
+        if not documents:
+            break
+        yield pd.DataFrame.from_records(documents, columns=columns)
+
+
+def read_mongo_chunks(mongopath, columns):
+    """
+    Projected, chunked extraction of the latest collection: (fetch date, generator of DataFrame chunks).
+    """
     mongo_client = connect_to_mongodb(mongopath)
     config = configparser.ConfigParser()
     config.read(mongopath)
@@ -58,9 +94,15 @@ def read_mongo_data(mongopath):
     date_str = latest_collection.split('_')[-1]
     formatted_date = f"{date_str[:4]}-{date_str[4:6]}-{date_str[6:]}"
 
-    mongodb_data = read_mongodb_data(mongo_client, db_name, latest_collection)
-    data = pd.DataFrame(list(mongodb_data))
+    mongodb_data = read_mongodb_data(mongo_client, db_name, latest_collection, columns=columns)
+
+    return formatted_date, cursor_to_frames(mongodb_data, columns)
+
 
+def read_mongo_data(mongopath, columns):
+    formatted_date, chunks = read_mongo_chunks(mongopath, columns)
+    frames = list(chunks)
+    data = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
     return formatted_date, data
 
 
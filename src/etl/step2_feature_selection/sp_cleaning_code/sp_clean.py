@@ -8,9 +8,9 @@ from dagster import AssetExecutionContext
 
 
 
-from .mango_to_python import read_mongo_data
+from .mango_to_python import read_mongo_chunks
 from .python_to_postgre import load_postgre_data
-from .data_process import extract_artist_name, group_data, clean_data
+from .data_process import extract_artist_names, group_data, merge_grouped_data, clean_data
 
 @asset(
         group_name="step2_feature_selection"
@@ -20,13 +20,23 @@ def sp_clean(context: AssetExecutionContext):
     path= os.path.join(script_dir, "config.ini") 
 
 
-    # extract
-    fetch_date_sp, raw_data = read_mongo_data(path)
+    # columns used by clean_data / extract_artist_names / group_data (only these are read from mongo)
+    columns = ["id", "track", "artist", "category", "playlistName", "trackURL", "date_added", "fetchDate",
+               "duration_ms", "time_signature", "danceability", "energy", "key", "loudness", "mode",
+               "speechiness", "acousticness", "instrumentalness", "liveness", "valence", "tempo"]
 
-    # transform
-    raw_data = clean_data(raw_data)
-    raw_data["artist"] = raw_data["artist"].apply(extract_artist_name)
-    trans_data = group_data(raw_data)
+    # extract
+    fetch_date_sp, chunks = read_mongo_chunks(path, columns)
+
+    # transform: cleaning and grouping chunk by chunk (only one chunk of raw rows in memory), then merge of the groups
+    grouped_chunks = []
+    for raw_data in chunks:
+        raw_data = clean_data(raw_data)
+        raw_data = extract_artist_names(raw_data)
+        grouped_chunks.append(group_data(raw_data))
+    if not grouped_chunks:
+        grouped_chunks.append(group_data(pd.DataFrame(columns=columns)))
+    trans_data = merge_grouped_data(grouped_chunks)
 
     # loading
     # trans_data.to_csv("data_cleaning_20241015_pyo.csv", encoding="utf-8")
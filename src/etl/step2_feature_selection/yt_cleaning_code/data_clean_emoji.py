@@ -1,6 +1,27 @@
+import numpy as np
 import pandas as pd
 import re
 
+# emoji code point ranges (the ranges below, merged: overlapping ranges are one range)
+EMOJI_RANGES = [
+    (0x2500, 0x2BEF),    # Misc symbols, Dingbats, Various symbols
+    (0x1F004, 0x1F0FF),  # Playing cards and symbols
+    (0x1F191, 0x1F251),  # Enclosed characters, Flags
+    (0x1F300, 0x1F6FF),  # Symbols & Pictographs, Emoticons, Transport & Map Symbols, Extended pictographs
+    (0x1F900, 0x1F9FF),  # Supplemental Symbols and Pictographs
+]
+# compiled once (remove_emoji of single values)
+EMOJI_PATTERN = re.compile(
+    "[" + "".join(f"{chr(first)}-{chr(last)}" for first, last in EMOJI_RANGES) + "]+",
+    flags=re.UNICODE,
+)
+# emoji flag of every unicode code point (1.1 MB): the mask of a text is one table lookup per code point
+EMOJI_TABLE = np.zeros(0x110000, dtype=bool)
+for _first, _last in EMOJI_RANGES:
+    EMOJI_TABLE[_first:_last + 1] = True
+# rows per vectorized pass in remove_emoji_column (bounds the size of the code point array)
+EMOJI_CHUNK_ROWS = 10000
+
 
 def convert_dates(data, columns):
     """
@@ -38,54 +59,66 @@ def remove_emoji(text):
     str: Text with emojis removed.
     """
     try:
-        emoji_pattern = re.compile(
-            "["
-            "\U0001F600-\U0001F64F"  # Emoticons
-            "\U0001F300-\U0001F5FF"  # Symbols & Pictographs
-            "\U0001F680-\U0001F6FF"  # Transport & Map Symbols
-            "\U0001F1E0-\U0001F1FF"  # Flags
-            "\U00002500-\U00002BEF"  # Misc symbols
-            "\U00002702-\U000027B0"  # Dingbats
-            "\U0001F900-\U0001F9FF"  # Supplemental Symbols and Pictographs
-            "\U0001F300-\U0001F3FA"  # Weather, landscape, and sky symbols
-            "\U0001F650-\U0001F67F"  # Extended pictographs
-            "\U0001F6C0-\U0001F6FF"  # Transport symbols extension
-            "\U0001F004-\U0001F0FF"  # Playing cards and symbols
-            "\U0001F191-\U0001F251"  # Enclosed characters
-            "\U00002600-\U000026FF"  # Various symbols (fixed range format)
-            "\U00002700-\U000027BF"  # Dingbats (fixed range format)
-            "\U0001F910-\U0001F9FF"  # Emoticons and gestures
-            "]+",
-            flags=re.UNICODE,
-        )
-        return emoji_pattern.sub(r"", text)
+        return EMOJI_PATTERN.sub(r"", text)
     except Exception as e:
         print(f"An unexpected error occurred while removing emojis: {e}")
         return text
 
 
-def clean_dataframe(df):
+def _remove_emoji_texts(texts):
+    # all texts as one array of code points: one vectorized table lookup instead of a regex scan per text
+    codes = np.frombuffer("".join(texts).encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+    is_emoji = EMOJI_TABLE[codes]
+    if not is_emoji.any():
+        return texts
+
+    # drop the emoji code points, then cut the result back into texts with their new lengths
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    ends = np.cumsum(lengths)
+    removed = np.bincount(np.searchsorted(ends, np.flatnonzero(is_emoji), side="right"), minlength=len(texts))
+    kept = codes[~is_emoji].tobytes().decode("utf-32-le", "surrogatepass")
+    new_ends = np.cumsum(lengths - removed).tolist()
+    new_starts = [0] + new_ends[:-1]
+    return [kept[start:end] for start, end in zip(new_starts, new_ends)]
+
+
+def remove_emoji_column(column):
+    """
+    Remove emojis from every text of a column; other values (None, lists, numbers) are kept as they are.
+
+    Parameters:
+    column (pd.Series): Column to be cleaned.
+
+    Returns:
+    pd.Series: Column with emojis removed.
     """
-    Clean an entire DataFrame by removing emojis from each cell.
+    values = column.tolist()
+    text_positions = [i for i, value in enumerate(values) if isinstance(value, str)]
+    for start in range(0, len(text_positions), EMOJI_CHUNK_ROWS):
+        positions = text_positions[start:start + EMOJI_CHUNK_ROWS]
+        for i, text in zip(positions, _remove_emoji_texts([values[i] for i in positions])):
+            values[i] = text
+    return pd.Series(values, index=column.index, dtype=column.dtype, name=column.name)
+
+
+def clean_dataframe(df, columns=None):
+    """
+    Clean a DataFrame by removing emojis from the text cells of the given columns.
 
     Parameters:
     df (pd.DataFrame): DataFrame to be cleaned.
+    columns (list of str): Text columns to be cleaned (None: every object column).
 
     Returns:
     pd.DataFrame: Cleaned DataFrame.
     """
     try:
-        cleaned_df = df.apply(
-            lambda x: (
-                x.map(
-                    lambda cell: (
-                        remove_emoji(str(cell)) if isinstance(cell, str) else cell
-                    )
-                )
-                if x.dtype == "O"
-                else x
-            )
-        )
+        if columns is None:
+            columns = [column for column in df.columns if df[column].dtype == "O"]
+        cleaned_df = df.copy()
+        for column in columns:
+            if column in cleaned_df.columns:
+                cleaned_df[column] = remove_emoji_column(cleaned_df[column])
         return cleaned_df
     except Exception as e:
         print(f"An unexpected error occurred while cleaning the DataFrame: {e}")
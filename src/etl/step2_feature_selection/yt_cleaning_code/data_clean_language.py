@@ -1,5 +1,25 @@
+import os
+import string
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
 import pandas as pd
-import re
+
+from .language_cache import LanguageCache, content_hash
+
+# unicode-range tables, built once =====================================
+def _char_range(first, last):
+    return frozenset(chr(code) for code in range(ord(first), ord(last) + 1))
+
+KOREAN_CHARS = _char_range("\uac00", "\ud7af") | _char_range("\u3130", "\u318f")
+JAPANESE_CHARS = _char_range("\u3040", "\u30ff") | _char_range("\u31f0", "\u31ff") | _char_range("\u3000", "\u303f")
+CHINESE_CHARS = _char_range("\u4e00", "\u9fff")
+# str.translate table deleting A-Za-z: the english letters of a text are len(text) - len(translated)
+DELETE_ENGLISH = str.maketrans("", "", string.ascii_letters)
+
+# texts not in the cache are classified in worker processes when they add up to at least this many characters
+LANGUAGE_PROCESSES = int(os.getenv('YT_LANGUAGE_PROCESSES', os.cpu_count() or 1))
+LANGUAGE_PROCESS_MIN_CHARS = int(os.getenv('YT_LANGUAGE_PROCESS_MIN_CHARS', 5000000))
 
 
 def detect_language(lyrics, threshold):
@@ -13,27 +33,6 @@ def detect_language(lyrics, threshold):
     Returns:
     str: Detected language.
     """
-
-    def contains_korean(text):
-        korean_pattern = re.compile(r"[\uac00-\ud7af\u3130-\u318f]")
-        return bool(korean_pattern.search(text))
-
-    def contains_japanese(text):
-        japanese_pattern = re.compile(r"[\u3040-\u30ff\u31f0-\u31ff\u3000-\u303f]")
-        return bool(japanese_pattern.search(text))
-
-    def contains_chinese(text):
-        chinese_pattern = re.compile(r"[\u4e00-\u9fff]")
-        return bool(chinese_pattern.search(text))
-
-    def count_english(text):
-        english_pattern = re.compile(r"[A-Za-z]")
-        return len(english_pattern.findall(text))
-
-    def count_non_english(text):
-        non_english_pattern = re.compile(r"[^A-Za-z]")
-        return len(non_english_pattern.findall(text))
-
     if lyrics is None or pd.isnull(lyrics):
         return "Unknown"
     lyrics = str(lyrics)
@@ -42,15 +41,17 @@ def detect_language(lyrics, threshold):
     if total_chars == 0:
         return "Unknown"
 
-    if contains_korean(lyrics):
+    # one pass over the text for the distinct characters, then set lookups in the tables
+    chars = set(lyrics)
+    if not chars.isdisjoint(KOREAN_CHARS):
         return "Korean"
-    elif contains_japanese(lyrics):
+    elif not chars.isdisjoint(JAPANESE_CHARS):
         return "Japanese"
-    elif contains_chinese(lyrics):
+    elif not chars.isdisjoint(CHINESE_CHARS):
         return "Chinese"
 
-    non_english_count = count_non_english(lyrics)
-    english_count = count_english(lyrics)
+    non_english_count = len(lyrics.translate(DELETE_ENGLISH))
+    english_count = total_chars - non_english_count
 
     non_english_ratio = non_english_count / (non_english_count + english_count)
     english_ratio = english_count / (non_english_count + english_count)
@@ -63,6 +64,52 @@ def detect_language(lyrics, threshold):
         return "Other"
 
 
+def _detect_chunk(texts, threshold):
+    return [detect_language(text, threshold) for text in texts]
+
+
+def detect_languages(texts, threshold=0.6, processes=LANGUAGE_PROCESSES, cache_path=None):
+    """
+    Detect the language of a whole column of texts.
+
+    Each distinct text is classified once; texts classified in a previous run are taken from the
+    LanguageCache (by content hash), and the rest are classified in worker processes when they are long enough.
+
+    Parameters:
+    texts (list or pd.Series): Texts to be analyzed (None / NaN: "Unknown").
+    threshold (float): Threshold to decide if the text is predominantly non-English.
+    processes (int): Worker processes for the texts that are not cached.
+    cache_path (str): LanguageCache path (None: the default cache).
+
+    Returns:
+    list of str: Detected language of each text.
+    """
+    texts = [None if text is None or pd.isnull(text) else str(text) for text in texts]
+    hashes = {text: content_hash(text) for text in texts if text}
+
+    cache = LanguageCache() if cache_path is None else LanguageCache(cache_path)
+    try:
+        cached = cache.get_many(hashes.values(), threshold)
+        new_texts = [text for text, hash_ in hashes.items() if hash_ not in cached]
+
+        if processes > 1 and sum(map(len, new_texts)) >= LANGUAGE_PROCESS_MIN_CHARS:
+            chunk_size = -(-len(new_texts) // (processes * 4))
+            chunks = [new_texts[i:i+chunk_size] for i in range(0, len(new_texts), chunk_size)]
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                new_languages = [language for languages in pool.map(partial(_detect_chunk, threshold=threshold), chunks)
+                                 for language in languages]
+        else:
+            new_languages = _detect_chunk(new_texts, threshold)
+
+        detected = {hashes[text]: language for text, language in zip(new_texts, new_languages)}
+        cache.put_many(detected, threshold)
+        cached.update(detected)
+    finally:
+        cache.close()
+
+    return [cached[hashes[text]] if text else "Unknown" for text in texts]
+
+
 def apply_language_detection(data, lyrics_column, threshold=0.6):
     """
     Apply language detection to the specified lyrics column of a DataFrame.
@@ -76,9 +123,7 @@ def apply_language_detection(data, lyrics_column, threshold=0.6):
     pd.DataFrame: DataFrame with an additional 'language' column indicating detected language.
     """
     try:
-        data["language"] = data[lyrics_column].apply(
-            lambda x: detect_language(x, threshold)
-        )
+        data["language"] = detect_languages(data[lyrics_column].tolist(), threshold)
         return data
     except KeyError as e:
         print(
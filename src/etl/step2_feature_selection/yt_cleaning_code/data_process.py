@@ -64,6 +64,45 @@ def group_data(data, required_columns):
         print(f"An unexpected error occurred while grouping the data: {e}")
 
 
+def merge_grouped_data(grouped_chunks):
+    """
+    Merge the group_data results of several chunks of rows into one row per 'songVideoId'.
+
+    Parameters:
+    grouped_chunks (list of pd.DataFrame): group_data result of each chunk.
+
+    Returns:
+    pd.DataFrame: Grouped DataFrame, as group_data of all the rows.
+    """
+    try:
+        union = lambda x: list(set(item for items in x for item in items))
+        grouped_data = (
+            pd.concat(grouped_chunks, ignore_index=True)
+            .groupby(["songVideoId"], as_index=False)
+            .agg(
+                {
+                    "songTitleShort": "first",
+                    "author": union,
+                    "songDurationSec": "first",
+                    "viewCount": "first",
+                    "publishDate": "first",
+                    "categoryTitle": union,
+                    "playlistTitle": union,
+                    "playlistDescription": union,
+                    "songURL": "first",
+                    "lyrics": "first",
+                    "lyricsSource": "first",
+                    "fetchDate": "first",
+                }
+            )
+        )
+        return grouped_data
+    except ValueError as e:
+        print(f"Error: No data to merge: {e}")
+    except Exception as e:
+        print(f"An unexpected error occurred while merging the grouped data: {e}")
+
+
 def filter_categories(data, categories_to_remove):
     """
     Filter out rows where 'categoryTitle' contains any of the specified categories to remove.
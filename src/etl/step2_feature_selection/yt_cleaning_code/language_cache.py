@@ -0,0 +1,58 @@
+import hashlib
+import os
+import time
+
+from sqlite_store import SqliteStore
+
+# detected language of every text ever classified (data/yt_language_cache.sqlite), shared across weekly runs
+script_dir = os.path.dirname(os.path.abspath(__file__))
+CACHE_PATH = os.path.join(script_dir, os.getenv('YT_LANGUAGE_CACHE_PATH', '../../data/yt_language_cache.sqlite'))
+
+
+def content_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class LanguageCache(SqliteStore):
+    """
+    detect_language results by (content hash, threshold): texts unchanged since a previous week are not classified again.
+    """
+
+    def __init__(self, path=CACHE_PATH):
+        super().__init__(path, ["""
+            CREATE TABLE IF NOT EXISTS language_cache (
+                content_hash TEXT NOT NULL,
+                threshold REAL NOT NULL,
+                language TEXT NOT NULL,
+                detected_at REAL NOT NULL,
+                PRIMARY KEY (content_hash, threshold)
+            )
+        """])
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, hashes, threshold):
+        """
+        Return {content_hash: language} of the given hashes that are in the cache.
+        """
+        hashes = list(dict.fromkeys(hashes))
+        found = dict(self.select_in(
+            "SELECT content_hash, language FROM language_cache WHERE threshold = ? AND content_hash IN ({keys})",
+            hashes, params=[threshold]))
+        self.hits += len(found)
+        self.misses += len(hashes) - len(found)
+        return found
+
+    def put_many(self, languages, threshold):
+        """
+        languages: {content_hash: language}
+        """
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO language_cache (content_hash, threshold, language, detected_at) VALUES (?, ?, ?, ?)",
+            [(hash_, threshold, language, now) for hash_, language in languages.items()])
+        self.conn.commit()
+        return len(languages)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
@@ -5,12 +5,13 @@ from .data_clean_emoji import convert_dates, clean_dataframe
 from .data_process import (
     select_required_columns,
     group_data,
+    merge_grouped_data,
     filter_categories,
     filter_playlist_titles,
 )
-from .data_clean_language import apply_language_detection
+from .data_clean_language import apply_language_detection, detect_languages
 from .python_to_postgre import load_postgre_data
-from .mango_to_python import read_mongo_data
+from .mango_to_python import read_mongo_chunks
 import os
 
 from dagster import asset 
@@ -20,21 +21,23 @@ from ..sp_cleaning_code.sp_clean import sp_clean
 
 
 def process_youtube_data(
-    data,
+    chunks,
     date_columns,
     required_columns,
     categories_to_remove,
     playlist_keywords_to_remove,
+    emoji_columns=None,
 ):
     """
     Load, process, and select specific columns from YouTube song data.
 
     Parameters:
-    file_path (str): Path to the CSV file containing YouTube song data.
+    chunks (iterable of pd.DataFrame): YouTube song data, chunk by chunk (e.g. read_mongo_chunks).
     date_columns (list of str): List of date columns to be processed.
     required_columns (list of str): List of columns to retain in the DataFrame.
     categories_to_remove (set): Set of category titles to be removed.
     playlist_keywords_to_remove (list of str): List of keywords to be removed from 'playlistTitle'.
+    emoji_columns (list of str): Text columns to remove emojis from (None: every object column).
     output_file_path (str): Path to save the processed CSV file.
 
     Returns:
@@ -49,18 +52,27 @@ def process_youtube_data(
         # if data is None:
         #     return None
 
-        # Convert dates for specified columns
-        data = convert_dates(data, date_columns)
-        if data is None:
-            return None
-
-        # Select required columns
-        data = select_required_columns(data, required_columns)
-        if data is None:
-            return None
-
-        # Group the data
-        data = group_data(data, required_columns)
+        # Row-wise steps and grouping chunk by chunk: only one chunk of raw rows is in memory at a time
+        grouped_chunks = []
+        for data in chunks:
+            # Convert dates for specified columns
+            data = convert_dates(data, date_columns)
+            if data is None:
+                return None
+
+            # Select required columns
+            data = select_required_columns(data, required_columns)
+            if data is None:
+                return None
+
+            # Group the chunk (its rows of a video are one row: the lyrics are kept once)
+            data = group_data(data, required_columns)
+            if data is None:
+                return None
+            grouped_chunks.append(data)
+
+        # Group the data: merge the groups of all chunks
+        data = merge_grouped_data(grouped_chunks)
         if data is None:
             return None
 
@@ -75,20 +87,15 @@ def process_youtube_data(
             return None
 
         # Clean the DataFrame by removing emojis
-        data = clean_dataframe(data)
+        data = clean_dataframe(data, emoji_columns)
 
         # Detect language of lyrics
         data = apply_language_detection(data, lyrics_column="lyrics")
         data = data[data["language"] != "Other"]
 
-        # Handle rows with language "Unknown"
-        unknown_data = data[data["language"] == "Unknown"].copy()
-        unknown_data["language"] = unknown_data["songTitleShort"].apply(
-            lambda x: apply_language_detection(
-                pd.DataFrame([x], columns=["lyrics"]), lyrics_column="lyrics"
-            )["language"].iloc[0]
-        )
-        data.loc[data["language"] == "Unknown", "language"] = unknown_data["language"]
+        # Handle rows with language "Unknown": detect from the titles, in one call
+        unknown = data["language"] == "Unknown"
+        data.loc[unknown, "language"] = detect_languages(data.loc[unknown, "songTitleShort"].tolist())
         data = data[data["language"] != "Other"]
 
         return data
@@ -123,6 +130,8 @@ def yt_clean(context: AssetExecutionContext):
             "lyricsSource",
             "fetchDate",
         ]
+        # text columns that can contain emojis (the list columns are not cleaned, as before)
+        emoji_columns = ["songTitleShort", "lyrics", "lyricsSource"]
         categories_to_remove = {"Bollywood & Indian", "Indonesian", "Thai"}
         playlist_keywords_to_remove = [
             "Iraqi",
@@ -146,16 +155,17 @@ def yt_clean(context: AssetExecutionContext):
 
 
 
-        # extract
-        fetch_date_yt, raw_data = read_mongo_data(path)
+        # extract (only the required columns are read from mongo, chunk by chunk)
+        fetch_date_yt, raw_chunks = read_mongo_chunks(path, required_columns)
 
         # transform
         trans_data = process_youtube_data(
-            raw_data,
+            raw_chunks,
             date_columns,
             required_columns,
             categories_to_remove,
             playlist_keywords_to_remove,
+            emoji_columns,
         )
 
         # loading
@@ -1,9 +1,20 @@
 import chromadb
+import re
 from datetime import datetime
 
 from .env_manager import EnvManager
 from .api_manager import OpenAPIManager
 
+# snapshot status of the embedding collections (named by date, yyyymmdd), in the metadata of each collection:
+# {"snapshot_status": "writing" while embeddings are added, then "complete", "rows": n}
+# (collections written before the status was recorded have none)
+SNAPSHOT_STATUS = "snapshot_status"
+# snapshot catalog: an empty collection whose metadata names the latest complete embedding collection
+# {"latest_complete": "yyyymmdd"}, read in one call by select_latest_collection_for_query
+CATALOG_COLLECTION = "snapshot_catalog"
+LATEST_COMPLETE = "latest_complete"
+SNAPSHOT_NAME = re.compile(r"\d{8}")
+
 
 class ChromaDBClientManager:
     def __init__(self):
@@ -28,8 +39,24 @@ class ChromaDBClientManager:
         self.collection = self.client.get_or_create_collection(name=name, 
                                                     metadata={"embedding_model" : embedding_model,
                                                               "created_date" : formatted_date})
+        self.record_snapshot(self.collection, status="writing")
         return self.collection
 
+    def record_snapshot(self, collection, status: str):
+        # modify replaces the whole metadata: keep embedding_model / created_date
+        metadata = dict(collection.metadata or {})
+        metadata.update({SNAPSHOT_STATUS: status, "rows": collection.count()})
+        collection.modify(metadata=metadata)
+        if status == "complete" and SNAPSHOT_NAME.fullmatch(collection.name):
+            self.record_latest_complete(collection.name)
+
+    def record_latest_complete(self, name: str):
+        # the catalog only moves forward: re-embedding an older date does not replace a newer snapshot
+        catalog = self.client.get_or_create_collection(name=CATALOG_COLLECTION)
+        latest = (catalog.metadata or {}).get(LATEST_COMPLETE)
+        if latest is None or int(name) >= int(latest):
+            catalog.modify(metadata={LATEST_COMPLETE: name})
+
     def embedding_add_to_collection(self, 
                                     collection, 
                                     rag_on_line_feature_cleaned: dict = None):
@@ -59,9 +86,19 @@ class ChromaDBClientManager:
             else:
                 print("Embeddings are None !!!")
 
+        self.record_snapshot(collection, status="complete")
+
     def select_latest_collection_for_query(self):
-        collections = self.client.list_collections()
-        lastest_date = str(max([int(collection.name) for collection in collections]))
+        # snapshot catalog: latest complete collection, one read
+        catalog = self.client.get_or_create_collection(name=CATALOG_COLLECTION)
+        lastest_date = (catalog.metadata or {}).get(LATEST_COMPLETE)
+        if lastest_date is None:
+            # no catalog entry (snapshots written before the catalog): latest yyyymmdd collection whose embeddings
+            # are complete (no status: written before the status); other names are not snapshots
+            lastest_date = max((collection.name for collection in self.client.list_collections()
+                                if SNAPSHOT_NAME.fullmatch(collection.name)
+                                and (collection.metadata or {}).get(SNAPSHOT_STATUS, "complete") == "complete"),
+                               key=int)
         self.collection = self.client.get_collection(name=lastest_date)
 
         return self.collection
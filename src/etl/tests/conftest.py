@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+# the etl modules import each other from src/etl (e.g. "from snapshot_catalog import ..."), as dagster runs them
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def pytest_configure(config):
+    # loggers are created when the modules are imported (before any fixture): their log files go to a temp dir
+    os.environ.setdefault("ETL_LOG_DIR", tempfile.mkdtemp(prefix="etl-test-logs-"))
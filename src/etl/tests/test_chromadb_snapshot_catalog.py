@@ -0,0 +1,73 @@
+import pytest
+
+pytest.importorskip("chromadb")
+pytest.importorskip("dotenv")
+
+from step3_embedding import chromadb_client_manager
+from step3_embedding.chromadb_client_manager import ChromaDBClientManager
+
+
+class FakeCollection:
+    def __init__(self, name, metadata=None, rows=0):
+        self.name = name
+        self.metadata = metadata
+        self.rows = rows
+
+    def count(self):
+        return self.rows
+
+    def modify(self, metadata):
+        self.metadata = metadata
+
+
+class FakeClient:
+    # the calls of chromadb.HttpClient used by the manager; list_collections is counted (the full scan)
+    def __init__(self, *collections):
+        self.collections = {collection.name: collection for collection in collections}
+        self.scans = 0
+
+    def get_or_create_collection(self, name, metadata=None):
+        return self.collections.setdefault(name, FakeCollection(name, metadata))
+
+    def get_collection(self, name):
+        return self.collections[name]
+
+    def list_collections(self):
+        self.scans += 1
+        return list(self.collections.values())
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    client = FakeClient(
+        FakeCollection("20241015", {"snapshot_status": "complete"}),
+        FakeCollection("20241022"),  # written before the status was recorded
+        FakeCollection("20241029", {"snapshot_status": "writing"}),
+        FakeCollection("rag_test"),
+        FakeCollection("20241105_backup"),
+    )
+    monkeypatch.setattr(ChromaDBClientManager, "_initialize_client", lambda self, env_manager: client)
+    return ChromaDBClientManager()
+
+
+def test_without_catalog_only_complete_date_collections_are_scanned(manager):
+    assert manager.select_latest_collection_for_query().name == "20241022"
+    assert manager.client.scans == 1
+
+
+def test_completed_snapshot_is_read_from_the_catalog(manager):
+    collection = manager.select_collection_for_add_data("20241029", embedding_model="text-embedding-3-small")
+    manager.record_snapshot(collection, status="complete")
+
+    assert manager.select_latest_collection_for_query().name == "20241029"
+    assert manager.client.scans == 0
+    catalog = manager.client.get_collection(chromadb_client_manager.CATALOG_COLLECTION)
+    assert catalog.metadata == {"latest_complete": "20241029"}
+
+
+def test_catalog_only_moves_forward(manager):
+    for name in ["20241029", "20241015"]:
+        manager.record_snapshot(manager.client.get_collection(name), status="complete")
+    manager.record_snapshot(manager.client.get_collection("rag_test"), status="complete")
+
+    assert manager.select_latest_collection_for_query().name == "20241029"
@@ -0,0 +1,36 @@
+import pytest
+
+pytest.importorskip("pymongo")
+mongomock = pytest.importorskip("mongomock")
+
+from snapshot_catalog import COMPLETE, FAILED, WRITING, latest_snapshot, record_snapshot, snapshots_complete
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient()["rag"]
+
+
+def test_latest_snapshot_is_the_latest_complete_one(db):
+    record_snapshot(db, "spotify", "spotify_data_20241014", "20241014", WRITING)
+    record_snapshot(db, "spotify", "spotify_data_20241014", "20241014", COMPLETE, rows=10)
+    record_snapshot(db, "spotify", "spotify_data_20241021", "20241021", COMPLETE, rows=12)
+    record_snapshot(db, "spotify", "spotify_data_20241028", "20241028", FAILED)
+    record_snapshot(db, "spotify", "spotify_data_20241104", "20241104", WRITING)
+    record_snapshot(db, "yt", "yt_category_songlist_20241111", "20241111", COMPLETE)
+
+    snapshot = latest_snapshot(db, "spotify")
+
+    assert snapshot["_id"] == "spotify_data_20241021"
+    assert snapshot["rows"] == 12
+    assert latest_snapshot(db, "other") is None
+
+
+def test_snapshots_complete_needs_every_source_of_the_date(db):
+    record_snapshot(db, "yt", "yt_category_songlist_20241021", "20241021", COMPLETE)
+    record_snapshot(db, "spotify", "spotify_data_20241021", "20241021", WRITING)
+    assert not snapshots_complete(db, ["yt", "spotify"], "20241021")
+
+    record_snapshot(db, "spotify", "spotify_data_20241021", "20241021", COMPLETE)
+    assert snapshots_complete(db, ["yt", "spotify"], "20241021")
+    assert not snapshots_complete(db, ["yt", "spotify"], "20241028")
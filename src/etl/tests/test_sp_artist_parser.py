@@ -0,0 +1,28 @@
+import pandas as pd
+
+from step2_feature_selection.sp_cleaning_code.artist_parser import parse_artist_names
+
+
+def test_decoded_and_stringified_lists_give_the_same_names():
+    artist = pd.Series([
+        [{"name": "Jay Chou", "id": "1"}, {"name": "Guns N' Roses"}],
+        """[{'name': 'Jay Chou', 'id': '1'}, {'name': "Guns N' Roses"}]""",
+        '[{"name": "Jay Chou", "id": "1"}, {"name": "Guns N\' Roses"}]',
+    ], index=[10, 11, 12])
+
+    names = parse_artist_names(artist)
+
+    assert names.index.tolist() == [10, 11, 12]
+    assert names.tolist() == [["Jay Chou", "Guns N' Roses"]] * 3
+
+
+def test_escaped_names_are_decoded():
+    artist = pd.Series([r"""[{'name': 'Sinéad O\'Connor'}, {'name': "say \"hi\""}]"""])
+
+    assert parse_artist_names(artist).tolist() == [["Sinéad O'Connor", 'say "hi"']]
+
+
+def test_missing_values_give_no_names():
+    artist = pd.Series([None, float("nan"), "", "[]", [{"id": "1"}, None]], dtype=object)
+
+    assert parse_artist_names(artist).tolist() == [[], [], [], [], []]
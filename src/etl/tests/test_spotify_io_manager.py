@@ -0,0 +1,58 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("dagster")
+
+from dagster import DagsterInstance, asset, materialize
+
+from step1_spotify_raw_data import io_manager
+from step1_spotify_raw_data.io_manager import SpotifyParquetIOManager
+
+SONGLIST = pd.DataFrame({"trackId": ["t1", "t2", "t3"], "playlistId": ["p1", "p1", "p2"]})
+
+
+@asset(io_manager_key="spotify_parquet_io_manager")
+def spotify_category_songlist() -> pd.DataFrame:
+    return SONGLIST
+
+
+@asset(io_manager_key="spotify_parquet_io_manager")
+def spotify_song_features(spotify_category_songlist: pd.DataFrame) -> pd.DataFrame:
+    pd.testing.assert_frame_equal(spotify_category_songlist, SONGLIST)
+    return spotify_category_songlist[["trackId"]]
+
+
+class FakeDatetime:
+    now = datetime(2024, 10, 21, 23, 50)
+
+    @classmethod
+    def today(cls):
+        return cls.now
+
+
+def test_deferred_run_loads_the_songlist_of_the_previous_day(tmp_path, monkeypatch):
+    monkeypatch.setattr(io_manager, "datetime", FakeDatetime)
+    instance = DagsterInstance.ephemeral()
+    resources = {"spotify_parquet_io_manager": SpotifyParquetIOManager(base_dir=str(tmp_path))}
+
+    # day D: spotify_category_songlist, then spotify_song_features is deferred
+    assert materialize([spotify_category_songlist], instance=instance, resources=resources).success
+
+    # day D+1: the deferred run loads the file written on day D
+    FakeDatetime.now = datetime(2024, 10, 22, 0, 30)
+    result = materialize([spotify_category_songlist, spotify_song_features], selection=[spotify_song_features],
+                         instance=instance, resources=resources)
+    assert result.success
+
+
+def test_runs_of_the_same_day_write_their_own_file(tmp_path):
+    instance = DagsterInstance.ephemeral()
+    resources = {"spotify_parquet_io_manager": SpotifyParquetIOManager(base_dir=str(tmp_path))}
+
+    for _ in range(2):
+        assert materialize([spotify_category_songlist], instance=instance, resources=resources).success
+
+    files = sorted(path.name for path in tmp_path.glob("*/spotify/*"))
+    assert len(files) == 2 and all(name.startswith("spotify_category_songlist_") for name in files)
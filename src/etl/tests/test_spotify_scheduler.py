@@ -0,0 +1,23 @@
+import json
+import time
+
+import pytest
+
+pytest.importorskip("spotipy")
+
+from step1_spotify_raw_data.scheduler import RequestScheduler
+
+
+def test_paused_client_leaves_the_keys_to_the_others(tmp_path):
+    # client_1 is still paused by a Retry-After of a previous run: client_2 takes every key, without waiting for it
+    state_path = tmp_path / "spotify_rate_state.json"
+    state_path.write_text(json.dumps({"clients": {"client_1": {"rate": 1.0, "paused_until": time.time() + 8}}}))
+    scheduler = RequestScheduler(["client_1", "client_2"], state_path=str(state_path))
+
+    start = time.monotonic()
+    results = dict(scheduler.run(lambda client, key: client, range(6)))
+    elapsed = time.monotonic() - start
+
+    assert results == {key: "client_2" for key in range(6)}
+    assert scheduler.failed == []
+    assert elapsed < 4
@@ -0,0 +1,64 @@
+import json
+import time
+
+import pytest
+
+pytest.importorskip("dagster")
+
+from dagster import build_sensor_context
+
+import rag_definition
+from step1_spotify_raw_data import scheduler
+from step1_spotify_raw_data.wait_between_assets import DEFERRED_RUN_TAG, clear_deferral_of
+
+
+@pytest.fixture
+def state_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "spotify_rate_state.json")
+    monkeypatch.setattr(rag_definition, "load_rate_state", lambda: scheduler.load_rate_state(path))
+    return path
+
+
+def write_state(path, paused_until):
+    # deferred by the run of 2024-10-21, the budget of every client comes back at paused_until
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"clients": {f"client_{i}": {"rate": 1.0, "paused_until": paused_until} for i in (1, 2)},
+                   "deferred_date": "20241021", "deferred_run_id": "run-1"}, f)
+
+
+def run_sensor():
+    return list(rag_definition.trigger_spotify_song_features(build_sensor_context()))
+
+
+def test_deferral_is_triggered_after_midnight(state_path):
+    # the budget came back after the day of the deferring run
+    write_state(state_path, paused_until=time.time() - 60)
+
+    requests = run_sensor()
+
+    assert [request.run_key for request in requests] == ["spotify_song_features_run-1"]
+    assert requests[0].tags[DEFERRED_RUN_TAG] == "run-1"
+    # not launched yet: the deferral is kept, the next tick requests the same run key (launched once by dagster)
+    assert scheduler.load_rate_state(state_path)["deferred_run_id"] == "run-1"
+    assert [request.run_key for request in run_sensor()] == ["spotify_song_features_run-1"]
+
+
+def test_deferral_is_cleared_by_the_run_it_triggered(state_path):
+    write_state(state_path, paused_until=time.time() - 60)
+
+    # a newer run deferred again: the run of the old deferral leaves it
+    scheduler.update_rate_state(lambda state: state.update(deferred_run_id="run-2"), state_path)
+    scheduler.update_rate_state(clear_deferral_of("run-1"), state_path)
+    assert scheduler.load_rate_state(state_path)["deferred_run_id"] == "run-2"
+
+    scheduler.update_rate_state(clear_deferral_of("run-2"), state_path)
+    state = scheduler.load_rate_state(state_path)
+    assert "deferred_date" not in state and "deferred_run_id" not in state
+    assert run_sensor() == []
+
+
+def test_deferral_waits_for_the_budget(state_path):
+    write_state(state_path, paused_until=time.time() + 3600)
+
+    assert run_sensor() == []
+    assert scheduler.load_rate_state(state_path)["deferred_run_id"] == "run-1"
@@ -0,0 +1,83 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from step1_yt_raw_data.batch_writer import BatchWriter, write_csv_rows, write_jsonl_rows
+from step1_yt_raw_data.journal import CsvJournal, StageJournal
+
+
+def test_rows_are_written_in_order_with_header(tmp_path):
+    path = tmp_path / "lyrics.csv"
+    with BatchWriter(str(path), write_csv_rows, header_rows=[["lyricsId", "lyrics"]], batch_size=2) as writer:
+        for i in range(5):
+            writer.put([f"id{i}", f"text {i}"])
+    assert path.read_text(encoding="utf-8").splitlines() == ["lyricsId,lyrics"] + [f"id{i},text {i}" for i in range(5)]
+    assert writer.items_put == writer.items_written == 5
+
+
+def test_put_does_not_block_and_drain_waits_for_the_writer(tmp_path):
+    released = threading.Event()
+
+    def slow_rows(f, rows):
+        released.wait()
+        write_jsonl_rows(f, rows)
+
+    async def produce(writer):
+        start = time.monotonic()
+        for i in range(50):
+            writer.put((i, i)) # the writer is stuck: put returns anyway
+        put_sec = time.monotonic() - start
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.2, released.set) # the event loop keeps running while drain waits
+        await writer.drain()
+        return put_sec
+
+    path = tmp_path / "out.jsonl"
+    with BatchWriter(str(path), slow_rows, batch_size=10, max_queue=5) as writer:
+        put_sec = asyncio.run(produce(writer))
+        assert writer._queue.qsize() <= 5
+    assert put_sec < 0.1
+    assert [json.loads(line)["key"] for line in path.read_text().splitlines()] == list(range(50))
+
+
+def test_failed_write_fails_the_next_put_and_close(tmp_path):
+    def failing_rows(f, rows):
+        raise OSError("disk full")
+
+    writer = BatchWriter(str(tmp_path / "out.jsonl"), failing_rows, batch_size=1, flush_interval=0.01).start()
+    writer.put(("a", 1))
+    deadline = time.monotonic() + 5
+    while writer._error is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    with pytest.raises(RuntimeError, match="disk full"):
+        writer.put(("b", 2))
+    with pytest.raises(RuntimeError, match="disk full"):
+        writer.close()
+
+
+def test_journal_resumes_skipping_done_ids_and_retrying_errors(tmp_path):
+    path = str(tmp_path / "songs_details.jsonl")
+    with StageJournal(path) as journal:
+        journal.append("v1", {"title": "a"})
+        journal.append("v2", "get_song_error")
+    # a crash left a half-written last line
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"key": "v3", "val')
+
+    with StageJournal(path) as journal:
+        assert journal.is_done("v1") and not journal.is_done("v2") and not journal.is_done("v3")
+        journal.append("v2", {"title": "b"})
+    assert dict(StageJournal(path).items()) == {"v1": {"title": "a"}, "v2": {"title": "b"}}
+
+
+def test_csv_journal_writes_the_header_once(tmp_path):
+    path = str(tmp_path / "lyrics.csv")
+    for lyrics_id in ("L1", "L2"):
+        with CsvJournal(path, header=["lyricsId", "lyrics", "lyricsSource"]) as journal:
+            journal.append(lyrics_id, [lyrics_id, "text", "source"])
+    assert open(path, encoding="utf-8").read().splitlines()[0] == "lyricsId,lyrics,lyricsSource"
+    with CsvJournal(path, header=[]) as journal:
+        assert journal.completed == {"L1", "L2"}
@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from step1_yt_raw_data.crawl_engine import AdaptiveLimiter
+
+
+async def complete(limiter, latency=0.1, ok=True):
+    await limiter.acquire()
+    await limiter.release(latency, ok)
+
+
+def test_healthy_calls_grow_the_window_by_about_one_per_window():
+    async def main():
+        limiter = AdaptiveLimiter("get_song", initial=4)
+        for _ in range(4):
+            await complete(limiter)
+        return limiter
+
+    limiter = asyncio.run(main())
+    assert 4.9 < limiter.limit < 5
+    assert limiter.stats()["calls"] == 4
+
+
+def test_burst_of_errors_backs_off_once_per_window():
+    async def main():
+        limiter = AdaptiveLimiter("get_song", initial=8)
+        for _ in range(8):
+            await complete(limiter)
+        before = limiter.limit
+        for _ in range(4):
+            await complete(limiter, ok=False)
+        return before, limiter
+
+    before, limiter = asyncio.run(main())
+    assert limiter.limit == pytest.approx(before * 0.5)
+    assert limiter.errors == 4
+
+
+def test_slow_response_backs_off_and_window_keeps_the_minimum():
+    async def main():
+        limiter = AdaptiveLimiter("get_lyrics", initial=2, minimum=2)
+        for _ in range(2):
+            await complete(limiter, latency=0.1)
+        before = limiter.limit
+        # over latency_tolerance (3x) the baseline
+        await complete(limiter, latency=1.0)
+        return before, limiter
+
+    before, limiter = asyncio.run(main())
+    assert before > 2
+    assert limiter.limit == 2
+    assert limiter.errors == 0
+
+
+def test_acquire_waits_for_a_free_slot():
+    async def main():
+        limiter = AdaptiveLimiter("get_song", initial=2)
+        await limiter.acquire()
+        await limiter.acquire()
+        waiting = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0.01)
+        blocked = not waiting.done()
+        await limiter.release(0.1, True)
+        await asyncio.wait_for(waiting, 1)
+        return blocked, limiter
+
+    blocked, limiter = asyncio.run(main())
+    assert blocked
+    assert limiter.in_flight == 2
@@ -0,0 +1,60 @@
+import json
+import time
+
+import pytest
+
+from step1_yt_raw_data.response_cache import ResponseCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache" / "responses.sqlite"),
+                          ttls={"get_song": 60, "get_lyrics": 60, "get_watch_playlist": 0})
+    yield cache
+    cache.close()
+
+
+def test_fresh_entry_is_a_hit(cache):
+    cache.put("get_song", "v1", {"videoId": "v1"})
+
+    assert cache.get("get_song", "v1") == (True, {"videoId": "v1"})
+    assert cache.get("get_song", "v2") == (False, None)
+    assert cache.stats() == {"get_song": {"hits": 1, "misses": 1}}
+    assert not cache.is_cached("get_playlist")
+
+
+def test_entry_older_than_its_ttl_is_a_miss(cache):
+    cache.put("get_watch_playlist", "v1", {"lyrics": "MPLYt_1"})
+    time.sleep(0.01)
+
+    assert cache.get("get_watch_playlist", "v1") == (False, None)
+
+
+def test_responses_without_lyrics_are_not_cached(cache):
+    cache.put("get_lyrics", "l1", {"lyrics": None})
+    cache.put("get_lyrics", "l2", {"lyrics": "la la la"})
+
+    assert cache.get("get_lyrics", "l1") == (False, None)
+    assert cache.get("get_lyrics", "l2") == (True, {"lyrics": "la la la"})
+
+
+def test_negative_entry_cached_by_an_older_version_is_a_miss(cache):
+    now = time.time()
+    value = json.dumps({"lyrics": ""})
+    cache.conn.execute("INSERT INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                       ("get_lyrics", "l1", value, len(value), now, now))
+
+    assert cache.get("get_lyrics", "l1") == (False, None)
+
+
+def test_evict_drops_least_recently_used_entries_over_max_bytes(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"), ttls={"get_song": 60}, max_bytes=110)
+    for key in ["a", "b", "c"]:
+        cache.put("get_song", key, {"text": "x" * 40})
+        time.sleep(0.01)
+    cache.get("get_song", "a")  # a is now the most recently used: b goes first (52 bytes each)
+    cache.evict()
+
+    assert cache.get("get_song", "b") == (False, None)
+    assert cache.get("get_song", "a")[0] and cache.get("get_song", "c")[0]
+    cache.close()
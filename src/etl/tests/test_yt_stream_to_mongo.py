@@ -0,0 +1,131 @@
+import asyncio
+import time
+
+import pytest
+
+for module in ("dagster", "ytmusicapi", "pymongo"):
+    pytest.importorskip(module)
+
+from step1_yt_raw_data import ytmusicapi_tojson
+from step1_yt_raw_data.mongo_sink import MongoSink
+from step1_yt_raw_data.records import SongRecordBuilder
+
+PLAYLISTS = [f"PL{i}" for i in range(3)]
+VIDEOS_PER_PLAYLIST = 20
+
+MOOD_CATEGORIES = {"Moods": [{"title": "Chill", "params": "p1"}]}
+MOOD_PLAYLISTS = {"p1": [{"title": playlist_id, "playlistId": playlist_id} for playlist_id in PLAYLISTS]}
+
+
+def get_playlist(playlist_id):
+    return {"title": playlist_id, "description": "", "year": "2024", "duration": "1h",
+            "trackCount": VIDEOS_PER_PLAYLIST, "related": [],
+            "tracks": [{"videoId": f"{playlist_id}v{i}", "title": "t", "artists": [{"name": "a", "id": "1"}],
+                        "album": None, "likeStatus": None, "isAvailable": True, "isExplicit": False,
+                        "videoType": "MUSIC_VIDEO_TYPE_ATV", "duration": "3:00", "duration_seconds": 180}
+                       for i in range(VIDEOS_PER_PLAYLIST)]}
+
+
+def get_song(video_id):
+    return {"playabilityStatus": {"status": "OK"},
+            "videoDetails": {"title": video_id, "lengthSeconds": "180", "channelId": "c", "viewCount": "10",
+                             "author": "a"},
+            "microformat": {"microformatDataRenderer": {"publishDate": "2024-10-21T05:00:10-07:00",
+                                                        "category": "Music", "uploadDate": "2024-10-21"}}}
+
+
+class FakeEngine:
+    max_concurrency = 4
+
+    async def call(self, endpoint, *args, **kwargs):
+        await asyncio.sleep(0)
+        if endpoint == "get_playlist":
+            return get_playlist(*args)
+        if endpoint == "get_song":
+            return get_song(*args)
+        if endpoint == "get_watch_playlist":
+            return {"lyrics": None}
+        raise ValueError(endpoint)
+
+
+class InsertResult:
+    def __init__(self, inserted_ids):
+        self.inserted_ids = inserted_ids
+
+
+class FakeCollection:
+    name = "yt_category_songlist_test"
+
+    def __init__(self, fail=False, delay=0.0):
+        self.fail = fail
+        self.delay = delay
+        self.records = []
+
+    def insert_many(self, records, ordered=True):
+        time.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("mongo is down")
+        self.records.extend(records)
+        return InsertResult(list(range(len(records))))
+
+
+@pytest.fixture(autouse=True)
+def crawl_dir(tmp_path, monkeypatch):
+    # journals under a temporary data/today, small queue so the producers block on it
+    monkeypatch.setattr(ytmusicapi_tojson, "absolute_data_path_dir", str(tmp_path))
+    monkeypatch.setattr(ytmusicapi_tojson, "STREAM_QUEUE_SIZE", 2)
+
+
+def new_sink(collection, batch_size=1):
+    return MongoSink(collection, writers=2, batch_size=batch_size, max_in_flight=4, flush_interval=0.01)
+
+
+async def crawl(sink, timeout=10):
+    records = SongRecordBuilder(MOOD_CATEGORIES, MOOD_PLAYLISTS, "2024-10-21", emit=sink.put)
+    await asyncio.wait_for(ytmusicapi_tojson.stream_playlist_songs(FakeEngine(), PLAYLISTS, records=records,
+                                                                   sink=sink),
+                           timeout=timeout)
+    return records.emitted
+
+
+async def max_loop_gap(coroutine):
+    # longest time the event loop did not run a 10 ms heartbeat while coroutine ran
+    gaps = []
+
+    async def heartbeat():
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(0.01)
+            gaps.append(time.monotonic() - start)
+
+    task = asyncio.ensure_future(heartbeat())
+    try:
+        result = await coroutine
+    finally:
+        task.cancel()
+    return result, max(gaps)
+
+
+def test_stream_playlist_songs_inserts_every_record():
+    collection = FakeCollection()
+    with new_sink(collection) as sink:
+        emitted = asyncio.run(crawl(sink))
+    assert emitted == len(collection.records) == len(PLAYLISTS) * VIDEOS_PER_PLAYLIST
+
+
+def test_stream_playlist_songs_fails_fast_when_the_sink_fails():
+    # the first sink error stops the crawl with that error, instead of leaving the producers blocked (timeout)
+    sink = new_sink(FakeCollection(fail=True)).start()
+    with pytest.raises(RuntimeError, match="mongo sink"):
+        asyncio.run(crawl(sink))
+    with pytest.raises(RuntimeError, match="mongo sink"):
+        sink.close()
+
+
+def test_slow_sink_does_not_block_the_event_loop():
+    # every insert_many takes 0.2 sec: the crawl waits for the sink in drain(), the event loop keeps running
+    collection = FakeCollection(delay=0.2)
+    with new_sink(collection, batch_size=10) as sink:
+        emitted, gap = asyncio.run(max_loop_gap(crawl(sink, timeout=30)))
+    assert emitted == len(collection.records) == len(PLAYLISTS) * VIDEOS_PER_PLAYLIST
+    assert gap < 0.15
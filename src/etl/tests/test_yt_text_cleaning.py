@@ -0,0 +1,43 @@
+import pandas as pd
+
+from step2_feature_selection.yt_cleaning_code.data_clean_emoji import remove_emoji, remove_emoji_column
+from step2_feature_selection.yt_cleaning_code.data_clean_language import detect_language, detect_languages
+from step2_feature_selection.yt_cleaning_code.language_cache import LanguageCache, content_hash
+
+
+def test_remove_emoji_keeps_the_other_characters():
+    assert remove_emoji("Love 😀 song 🎵🎶") == "Love  song "
+    assert remove_emoji("周杰倫 - 晴天 (Official MV)") == "周杰倫 - 晴天 (Official MV)"
+
+
+def test_remove_emoji_column_matches_remove_emoji_and_keeps_other_values():
+    column = pd.Series(["🔥 hot 🔥", None, ["😀"], 3, "", "no emoji"], index=list("abcdef"), name="title")
+
+    cleaned = remove_emoji_column(column)
+
+    assert cleaned.index.tolist() == list("abcdef")
+    assert cleaned.name == "title"
+    assert cleaned.tolist() == [remove_emoji("🔥 hot 🔥"), None, ["😀"], 3, "", "no emoji"]
+
+
+def test_detect_language():
+    assert detect_language("사랑해 love", 0.6) == "Korean"
+    assert detect_language("ありがとう 愛", 0.6) == "Japanese"
+    assert detect_language("我愛你", 0.6) == "Chinese"
+    assert detect_language("hello world", 0.6) == "English"
+    assert detect_language("1234 5678 !!", 0.6) == "Other"
+    assert detect_language(None, 0.6) == "Unknown"
+    assert detect_language("", 0.6) == "Unknown"
+
+
+def test_detect_languages_classifies_each_text_once_and_caches_it(tmp_path):
+    cache_path = str(tmp_path / "language.sqlite")
+    texts = ["hello world", None, "我愛你", "hello world"]
+
+    assert detect_languages(texts, processes=1, cache_path=cache_path) == ["English", "Unknown", "Chinese", "English"]
+
+    cache = LanguageCache(cache_path)
+    assert cache.get_many([content_hash("hello world"), content_hash("我愛你")], 0.6) == {
+        content_hash("hello world"): "English", content_hash("我愛你"): "Chinese"}
+    assert cache.get_many([content_hash("hello world")], 0.9) == {}
+    cache.close()